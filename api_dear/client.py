@@ -0,0 +1,187 @@
+import threading
+import structlog
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+
+from api_dear.models import DearEfrisClientCredentials
+from api_dear.ratelimit import acquire_dear_request, block_dear_account
+from taxmoja.services import TTLCache, get_pooled_session
+
+
+struct_logger = structlog.get_logger(__name__)
+
+# Customer fields read by the clean_* helpers besides the configurable ones
+DEAR_CUSTOMER_FIELDS = ("ID", "TaxNumber", "SalesRepresentative")
+DEAR_PRODUCT_FIELDS = ("ID", "SKU", "Name", "AverageCost")
+
+# Largest page the dear list endpoints return
+DEAR_PAGE_SIZE = 1000
+
+_client_caches = {}
+_client_caches_lock = threading.Lock()
+
+
+def get_client_cache(client_id, name, ttl, maxsize):
+    with _client_caches_lock:
+        cache = _client_caches.get((client_id, name))
+        if cache is None:
+            cache = TTLCache(ttl, maxsize=maxsize)
+            _client_caches[(client_id, name)] = cache
+        return cache
+
+
+def clear_client_caches(client_id):
+    with _client_caches_lock:
+        for key in [key for key in _client_caches if key[0] == client_id]:
+            del _client_caches[key]
+
+
+class DearClient:
+    # One client's credentials, loaded once, plus the pooled session for its
+    # dear url. Build one per webhook and pass it around instead of the id.
+
+    def __init__(self, client_data):
+        self.client_data = client_data
+        self.base_url = client_data.dear_url.dear_url
+        self.session = get_pooled_session(
+            self.base_url, pool_size=settings.DEAR_HTTP_POOL_SIZE
+        )
+        self.headers = {
+            "api-auth-accountid": client_data.dear_account_id,
+            "api-auth-applicationkey": client_data.dear_app_key,
+        }
+
+    @classmethod
+    def for_client(cls, client_acc_id):
+        client_data = get_object_or_404(
+            DearEfrisClientCredentials.objects.select_related("dear_url"),
+            pk=client_acc_id,
+        )
+        return cls(client_data)
+
+    def get(self, url: str):
+        try:
+            url = "{}/{}".format(self.base_url, url)
+            account_id = self.client_data.dear_account_id
+
+            for attempt in range(settings.DEAR_RATE_LIMIT_MAX_RETRIES + 1):
+                acquire_dear_request(account_id)
+                response = self.session.get(
+                    url,
+                    headers=self.headers,
+                    timeout=(
+                        settings.DEAR_HTTP_CONNECT_TIMEOUT,
+                        settings.DEAR_HTTP_READ_TIMEOUT,
+                    ),
+                )
+                if response.status_code != 429:
+                    break
+
+                # Honour Retry-After, falling back to exponential backoff
+                try:
+                    retry_after = float(response.headers["Retry-After"])
+                except (KeyError, ValueError):
+                    retry_after = 2 ** attempt
+                struct_logger.info(
+                    event="send_dear_request",
+                    url=url,
+                    attempt=attempt,
+                    retry_after=retry_after,
+                    msg="Dear rate limit hit",
+                )
+                block_dear_account(account_id, retry_after)
+
+            struct_logger.info(
+                event="send_dear_request",
+                response=response.text,
+                msg="Sending dear request",
+            )
+
+            return response.json()
+
+        except Exception as ex:
+            return {"message": "DEAR URL is unvailable {}".format(str(ex))}
+
+    def get_customer(self, customer_id):
+        # Returns the customer fields invoice processing needs, cached per
+        # client since the same customers come back on most sales
+        cache = get_client_cache(
+            self.client_data.pk,
+            "customer",
+            settings.DEAR_CUSTOMER_CACHE_TTL,
+            settings.DEAR_CUSTOMER_CACHE_SIZE,
+        )
+        customer = cache.get(customer_id)
+        if customer is not None:
+            return customer
+
+        customer_data = self.get("/customer?ID={}".format(customer_id))
+        customer = customer_data["CustomerList"][0]
+
+        fields = DEAR_CUSTOMER_FIELDS + (
+            self.client_data.dear_tax_pin_field,
+            self.client_data.dear_is_export_field,
+            self.client_data.dear_buyer_type_field,
+        )
+        customer = {field: customer[field] for field in fields if field in customer}
+        cache.set(customer_id, customer)
+
+        return customer
+
+    def get_products(self, product_ids):
+        # Returns {product id: product fields} from the per-client product
+        # cache. A few misses are fetched one by one, past
+        # DEAR_PRODUCT_PAGE_THRESHOLD the product list is paged through
+        # instead, caching every product on the way.
+        cache = get_client_cache(
+            self.client_data.pk,
+            "product",
+            settings.DEAR_PRODUCT_CACHE_TTL,
+            settings.DEAR_PRODUCT_CACHE_SIZE,
+        )
+
+        products = {}
+        missing = set()
+        for product_id in product_ids:
+            product = cache.get(product_id)
+            if product is None:
+                missing.add(product_id)
+            else:
+                products[product_id] = product
+
+        if len(missing) > settings.DEAR_PRODUCT_PAGE_THRESHOLD:
+            page = 1
+            while missing:
+                product_data = self.get(
+                    "/product?Page={}&Limit={}".format(page, DEAR_PAGE_SIZE)
+                )
+                page_products = product_data.get("Products", [])
+                for product in page_products:
+                    product = self._product_fields(product)
+                    cache.set(product["ID"], product)
+                    if product["ID"] in missing:
+                        missing.discard(product["ID"])
+                        products[product["ID"]] = product
+
+                if len(page_products) < DEAR_PAGE_SIZE:
+                    break
+                page += 1
+        else:
+            for product_id in missing:
+                product_data = self.get("/product?ID={}".format(product_id))
+                for product in product_data.get("Products", [])[:1]:
+                    product = self._product_fields(product)
+                    cache.set(product_id, product)
+                    products[product_id] = product
+
+        return products
+
+    def _product_fields(self, product):
+        fields = DEAR_PRODUCT_FIELDS + (
+            self.client_data.dear_stock_description_field,
+            self.client_data.dear_stock_measure_unit_field,
+            self.client_data.dear_stock_commodity_category_field,
+            self.client_data.dear_stock_currency_field,
+        )
+        return {field: product[field] for field in fields if field in product}
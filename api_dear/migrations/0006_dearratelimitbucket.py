@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_dear', '0005_dearefrisclientcredentials_dear_stock_commodity_category_field_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DearRateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dear_account_id', models.CharField(max_length=255, unique=True)),
+                ('tokens', models.FloatField(default=0)),
+                ('date_refilled', models.DateTimeField()),
+                ('blocked_until', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Rate Limit',
+                'verbose_name_plural': 'Rate Limits',
+            },
+        ),
+    ]
@@ -128,6 +128,21 @@ class DearOutgoingInvoice(EfrisOutgoingInvoice):
         verbose_name_plural = "Invoices"
 
 
+class DearRateLimitBucket(models.Model):
+    # Token bucket shared by every worker calling dear for one account
+    dear_account_id = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField(default=0)
+    date_refilled = models.DateTimeField()
+    blocked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Rate Limit"
+        verbose_name_plural = "Rate Limits"
+
+    def __str__(self):
+        return self.dear_account_id
+
+
 @receiver(post_save, sender=DearEfrisGoodsAdjustment)
 def create_efris_goods_adjustment(sender, instance, **kwargs):
     from .services import create_xero_goods_adjustment
@@ -140,3 +155,11 @@ def create_efris_goods_configuration(sender, instance, **kwargs):
     from .services import create_xero_goods_configuration
 
     create_xero_goods_configuration(instance.__dict__)
+
+
+@receiver(post_save, sender=DearEfrisClientCredentials)
+def clear_dear_client_caches(sender, instance, **kwargs):
+    from .client import clear_client_caches
+
+    # The customer and product field names may have changed
+    clear_client_caches(instance.pk)
@@ -0,0 +1,71 @@
+import datetime
+import time
+import structlog
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from api_dear.models import DearRateLimitBucket
+
+
+struct_logger = structlog.get_logger(__name__)
+
+
+def _take_token(dear_account_id):
+    # Refills the account's bucket for the time elapsed and takes one token.
+    # Returns 0 on success, otherwise the seconds to wait before trying again.
+    rate = settings.DEAR_RATE_LIMIT_PER_MINUTE / 60.0
+    burst = settings.DEAR_RATE_LIMIT_BURST
+    now = timezone.now()
+
+    with transaction.atomic():
+        bucket, _ = DearRateLimitBucket.objects.select_for_update().get_or_create(
+            dear_account_id=dear_account_id,
+            defaults={"tokens": burst, "date_refilled": now},
+        )
+
+        if bucket.blocked_until and bucket.blocked_until > now:
+            return (bucket.blocked_until - now).total_seconds()
+
+        elapsed = max((now - bucket.date_refilled).total_seconds(), 0)
+        bucket.tokens = min(burst, bucket.tokens + elapsed * rate)
+        bucket.date_refilled = now
+
+        wait = 0
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+        else:
+            wait = (1 - bucket.tokens) / rate
+
+        bucket.save(update_fields=["tokens", "date_refilled"])
+
+    return wait
+
+
+def acquire_dear_request(dear_account_id):
+    # Blocks until the account may make another dear request, so bursts are
+    # queued behind the quota instead of being rejected by dear
+    while True:
+        try:
+            wait = _take_token(dear_account_id)
+        except IntegrityError:
+            # Another worker created the bucket at the same moment
+            continue
+
+        if not wait:
+            return
+
+        struct_logger.info(
+            event="dear_rate_limit", dear_account_id=dear_account_id, wait=wait
+        )
+        time.sleep(wait)
+
+
+def block_dear_account(dear_account_id, seconds):
+    # Pauses every worker's requests for the account, used when dear answers
+    # 429 despite the bucket
+    blocked_until = timezone.now() + datetime.timedelta(seconds=seconds)
+    DearRateLimitBucket.objects.filter(dear_account_id=dear_account_id).update(
+        blocked_until=blocked_until, tokens=0, date_refilled=blocked_until
+    )
@@ -1,10 +1,10 @@
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.conf import settings
 import structlog
-import requests
 
-from api_dear.models import DearEfrisClientCredentials
+from api_dear.client import DearClient
 from api_mita.services import send_mita_request
+from manager_invoice.services import queue_mita_invoice
+from taxmoja.services import map_concurrently
 
 
 struct_logger = structlog.get_logger(__name__)
@@ -13,22 +13,20 @@ struct_logger = structlog.get_logger(__name__)
 def process_invoice(response, client_acc_id):
     try:
         # Get local client
-        client_data = get_object_or_404(
-            DearEfrisClientCredentials, pk=client_acc_id)
+        dear = DearClient.for_client(client_acc_id)
+        client_data = dear.client_data
         # retrieving invoice data
 
         task_id = response["SaleTaskID"]
         url = "/sale?ID={}".format(task_id)
-        invoice_data = send_dear_api_request(url, client_acc_id)
+        invoice_data = dear.get(url)
 
         goods_details = []
         invoices = invoice_data["Invoices"]
 
         # retrieving customer data
 
-        url = "/customer?ID={}".format(invoice_data["CustomerID"])
-        customer_data = send_dear_api_request(url, client_acc_id)
-        customer = customer_data["CustomerList"][0]
+        customer = dear.get_customer(invoice_data["CustomerID"])
 
         struct_logger.info(
             event="create_outgoing_dear_invoice",
@@ -73,11 +71,11 @@ def process_invoice(response, client_acc_id):
 
         struct_logger.info(
             event="dear_invoice_processing",
-            message="Sending invoice to mita",
-            response=tax_invoice.text,
+            message="Invoice queued for mita",
+            response=str(tax_invoice),
         )
 
-        return tax_invoice.text
+        return str(tax_invoice)
 
     except Exception as ex:
         struct_logger.error(
@@ -91,15 +89,15 @@ def process_invoice(response, client_acc_id):
 def process_credit_note(response, client_acc_id):
     try:
         # Get local client
-        client_data = get_object_or_404(
-            DearEfrisClientCredentials, pk=client_acc_id)
+        dear = DearClient.for_client(client_acc_id)
+        client_data = dear.client_data
 
         # retrieving credit_note data
 
         task_id = response["SaleID"]
         url = "/sale/creditnote?SaleID={}".format(task_id)
 
-        invoice_data = send_dear_api_request(url, client_acc_id)
+        invoice_data = dear.get(url)
 
         # invoices = invoice_data["Invoices"]
         credit_notes = invoice_data["CreditNotes"]
@@ -107,15 +105,13 @@ def process_credit_note(response, client_acc_id):
         # Old invoice data
 
         url = "/sale?ID={}".format(task_id)
-        invoice_data = send_dear_api_request(url, client_acc_id)
+        invoice_data = dear.get(url)
 
         goods_details = []
 
         # retrieving customer data
 
-        url = "/customer?ID={}".format(invoice_data["CustomerID"])
-        customer_data = send_dear_api_request(url, client_acc_id)
-        customer = customer_data["CustomerList"][0]
+        customer = dear.get_customer(invoice_data["CustomerID"])
 
         struct_logger.info(
             event="create_outgoing_dear_credit_note",
@@ -158,11 +154,11 @@ def process_credit_note(response, client_acc_id):
 
         struct_logger.info(
             event="create_outgoing_dear_credit_note",
-            message="Sending invoice to mita",
-            response=tax_invoice.text,
+            message="Credit note queued for mita",
+            response=str(tax_invoice),
         )
 
-        return tax_invoice.text
+        return str(tax_invoice)
 
     except Exception as ex:
         struct_logger.error(
@@ -174,29 +170,9 @@ def process_credit_note(response, client_acc_id):
 
 
 def send_dear_api_request(url: str, client_acc_id):
-    try:
-        # Get local client
-        client_data = get_object_or_404(
-            DearEfrisClientCredentials, pk=client_acc_id)
-        url = "{}/{}".format(client_data.dear_url.dear_url, url)
-
-        account_id = client_data.dear_account_id
-        app_key = client_data.dear_app_key
-
-        headers = {"api-auth-accountid": account_id,
-                   "api-auth-applicationkey": app_key}
-        response = requests.request("GET", url, headers=headers)
-
-        struct_logger.info(
-            event="send_dear_request",
-            response=response.text,
-            msg="Sending dear request",
-        )
-
-        return response.json()
-
-    except Exception as ex:
-        return {"message": "DEAR URL is unvailable {}".format(str(ex))}
+    # Kept for callers holding only the id, build a DearClient when making
+    # more than one request
+    return DearClient.for_client(client_acc_id).get(url)
 
 
 def clean_currency_product(currency):
@@ -357,85 +333,121 @@ def create_mita_invoice(
     }
     struct_logger.info(event="sending dear invoice to mita",
                        mita_payload=mita_payload)
-    return send_mita_request("invoice/queue?erp=dear", mita_payload, client_data)
+    return queue_mita_invoice(
+        mita_payload,
+        client_data,
+        "DEAR",
+        origin_request_data=invoice_data,
+        url_ext="invoice/queue?erp=dear",
+    )
 
 
 def create_goods_configuration(request, client_acc_id):
-    # Get local client
-    client_data = get_object_or_404(
-        DearEfrisClientCredentials, pk=client_acc_id)
-    for sku in request:
-        try:
-            url = "/product?ID={}".format(sku["productID"])
+    # Configures every sku of the webhook on DEAR_MITA_WORKERS threads, each
+    # fetching its product and posting it to mita, so dear fetches overlap
+    # with mita submissions. Returns one result per sku.
+    dear = DearClient.for_client(client_acc_id)
+    client_data = dear.client_data
 
-            product_data = send_dear_api_request(url, client_acc_id)
+    if len(request) > settings.DEAR_PRODUCT_PAGE_THRESHOLD:
+        # Warm the product cache with paged list calls
+        dear.get_products([sku["productID"] for sku in request])
 
-            struct_logger.info(
-                event="create_dear_goods_configuration",
-                product=product_data,
-            )
+    def configure_sku(sku):
+        product_data = dear.get_products([sku["productID"]])[sku["productID"]]
 
-            product_data = product_data["Products"][0]
+        struct_logger.info(
+            event="create_dear_goods_configuration",
+            product=product_data,
+        )
 
-            goods_name = sku["productName"]
-            goods_code = sku["productName"]
-            unit_price = sku["Price"]
-            description = product_data[client_data.dear_stock_description_field]
-            measure_unit = product_data[client_data.dear_stock_measure_unit_field]
-            commodity_category = product_data[
-                client_data.dear_stock_commodity_category_field
-            ]
+        goods_name = sku["productName"]
+        goods_code = sku["productName"]
+        unit_price = sku["Price"]
+        description = product_data[client_data.dear_stock_description_field]
+        measure_unit = product_data[client_data.dear_stock_measure_unit_field]
+        commodity_category = product_data[
+            client_data.dear_stock_commodity_category_field
+        ]
+
+        currency = clean_currency_product(
+            product_data[client_data.dear_stock_currency_field]
+        )
 
-            currency = clean_currency_product(
-                product_data[client_data.dear_stock_currency_field]
-            )
+        efris_stock_configuration_payload = {
+            "goods_name": goods_name,
+            "goods_code": goods_code,
+            "unit_price": unit_price,
+            "measure_unit": measure_unit,
+            "currency": currency,
+            "commodity_tax_category": commodity_category,
+            "goods_description": description,
+        }
 
-            efris_stock_configuration_payload = {
-                "goods_name": goods_name,
-                "goods_code": goods_code,
-                "unit_price": unit_price,
-                "measure_unit": measure_unit,
-                "currency": currency,
-                "commodity_tax_category": commodity_category,
-                "goods_description": description,
-            }
+        struct_logger.info(
+            event="create_dear_goods_configuration",
+            efris_product=efris_stock_configuration_payload,
+            message="sending dear goods configuration to mita",
+        )
+        return send_mita_request(
+            "stock/configuration", efris_stock_configuration_payload, client_data
+        )
 
+    results = []
+    for sku, efris_response in map_concurrently(
+        configure_sku, request, max_workers=settings.DEAR_MITA_WORKERS
+    ):
+        if isinstance(efris_response, Exception):
             struct_logger.info(
                 event="create_dear_goods_configuration",
-                efris_product=efris_stock_configuration_payload,
-                message="sending dear goods configuration to mita",
-            )
-            efris_response = send_mita_request(
-                "stock/configuration", efris_stock_configuration_payload, client_data
+                error=str(efris_response),
+                message="Could not configure product",
             )
-            return HttpResponse(
-                "xero Item saved {}  \n EFRIS Item Saved {} ".format(
-                    "item", efris_response
-                )
+            results.append(
+                {
+                    "sku": sku.get("productName"),
+                    "message": "Could not configure product",
+                    "error": str(efris_response),
+                }
             )
+            continue
 
-        except Exception as ex:
-            struct_logger.info(
-                event="create_dear_goods_configuration",
-                error=str(ex),
-                message="Could not configure product",
-            )
-            return {"sku": sku, "message": "Could not configure product", "error": ex}
+        results.append(
+            {
+                "sku": sku["productName"],
+                "status_code": efris_response.status_code,
+                "response": efris_response.text,
+            }
+        )
+
+    return results
 
 
 def create_goods_adjustment(request, client_acc_id):
-    client_data = get_object_or_404(
-        DearEfrisClientCredentials, pk=client_acc_id)
+    dear = DearClient.for_client(client_acc_id)
+    client_data = dear.client_data
 
     try:
         task_id = request["TaskID"]
         url = "/stockadjustment?TaskID={}".format(task_id)
-        stock_data = send_dear_api_request(url, client_acc_id)
+        stock_data = dear.get(url)
 
         adjusted_stock = stock_data["ExistingStockLines"]
+        products = dear.get_products(
+            [stock["ProductID"] for stock in adjusted_stock]
+        )
+
+        struct_logger.info(
+            event="dear stock adjustment",
+            stock_data=adjusted_stock,
+            products=len(products),
+        )
 
+        adjustments = []
         for stock in adjusted_stock:
             variance = stock["Adjustment"] - stock["QuantityOnHand"]
+            if variance == 0:
+                continue
 
             if variance > 0:
                 operation_type = "101"
@@ -446,36 +458,48 @@ def create_goods_adjustment(request, client_acc_id):
                 adjust_type = "104"
                 stock_in_type = ""
 
-            url = "/product?ID={}".format(stock["ProductID"])
-            product_data = send_dear_api_request(url, client_acc_id)
-            product_data = product_data["Products"][0]
-
-            struct_logger.info(
-                event="dear stock adjustment",
-                stock_data=adjusted_stock,
-                product_data=product_data,
+            product_data = products.get(stock["ProductID"])
+            if product_data is None:
+                struct_logger.error(
+                    event="create_dear_goods_adjustment",
+                    product_id=stock["ProductID"],
+                    message="Product not found in dear",
+                )
+                continue
+
+            adjustments.append(
+                {
+                    "goods_code": stock["ProductID"],
+                    "supplier": "",
+                    "supplier_tin": "",
+                    "stock_in_type": stock_in_type,
+                    "quantity": abs(variance),
+                    "purchase_price": product_data["AverageCost"],
+                    "purchase_remarks": stock_data["StocktakeNumber"],
+                    "operation_type": operation_type,
+                    "adjust_type": adjust_type,
+                }
             )
-            efris_stock_adjustment_payload = {
-                "goods_code": stock["ProductID"],
-                "supplier": "",
-                "supplier_tin": "",
-                "stock_in_type": stock_in_type,
-                "quantity": abs(variance),
-                "purchase_price": product_data["AverageCost"],
-                "purchase_remarks": stock_data["StocktakeNumber"],
-                "operation_type": operation_type,
-                "adjust_type": adjust_type,
-            }
+
+        def send_adjustment(efris_stock_adjustment_payload):
             struct_logger.info(
                 event="create_dear_goods_adjustment",
                 efris_product=efris_stock_adjustment_payload,
                 message="sending dear goods adjustment to mita",
             )
-            efris_response = send_mita_request(
+            return send_mita_request(
                 "stock/adjustment", efris_stock_adjustment_payload, client_data
             )
 
-            return efris_response
+        return [
+            {
+                "goods_code": payload["goods_code"],
+                "response": getattr(efris_response, "text", str(efris_response)),
+            }
+            for payload, efris_response in map_concurrently(
+                send_adjustment, adjustments, max_workers=settings.DEAR_MITA_WORKERS
+            )
+        ]
 
     except Exception as ex:
         struct_logger.info(
@@ -484,7 +508,7 @@ def create_goods_adjustment(request, client_acc_id):
             message="Could not configure product",
         )
         return {
-            "sku": product_data,
+            "task_id": request.get("TaskID") if isinstance(request, dict) else None,
             "message": "Could not adjust product quantities",
             "error": ex,
         }
@@ -494,8 +518,8 @@ def create_goods_stock_in(
     dear_stock, client_acc_id, operation_type="101", adjust_type="", stock_in_type="103"
 ):
     try:
-        client_data = get_object_or_404(
-            DearEfrisClientCredentials, pk=client_acc_id)
+        dear = DearClient.for_client(client_acc_id)
+        client_data = dear.client_data
         for stock in dear_stock:
             struct_logger.info(
                 event="dear stock adjustment",
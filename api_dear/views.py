@@ -1,5 +1,5 @@
 import json
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 
@@ -65,7 +65,7 @@ def stock_configuration_webhook(request, client_acc_id):
             event="processing dear goods configuration", response=goods_configuration
         )
 
-        return HttpResponse(status=200)
+        return JsonResponse(goods_configuration, safe=False)
     except Exception as ex:
         struct_logger.error(event="processing dear goods configuration", error=str(ex))
         return HttpResponse(status=500)
@@ -1,4 +1,6 @@
 from django.db import models
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save
 
 
 
@@ -14,3 +16,11 @@ class MitaCredentials(models.Model):
 
     def __str__(self):
         return self.mita_url
+
+
+@receiver(post_save, sender=MitaCredentials)
+@receiver(post_delete, sender=MitaCredentials)
+def clear_mita_credentials(sender, instance, **kwargs):
+    from .services import clear_mita_credentials_cache
+
+    clear_mita_credentials_cache()
@@ -1,15 +1,58 @@
 import json
-import requests
+import threading
+import time
 import structlog
 
+from django.conf import settings
+
 from api_mita.models import MitaCredentials
+from taxmoja.services import get_pooled_session
 
 struct_logger = structlog.get_logger(__name__)
 
+_mita_credentials = (None, 0.0)
+_mita_credentials_lock = threading.Lock()
+
+
+def get_mita_session(mita_url):
+    # Shared keep-alive session used by every connector submitting to mita
+    return get_pooled_session(
+        mita_url,
+        pool_size=settings.MITA_HTTP_POOL_SIZE,
+        keep_alive=settings.MITA_HTTP_KEEP_ALIVE,
+    )
+
+
+def get_active_mita_credentials():
+    # Active mita url cached in process for MITA_CREDENTIALS_CACHE_TTL seconds,
+    # cleared by the MitaCredentials save/delete signals
+    global _mita_credentials
+
+    mita_credentials, expires_at = _mita_credentials
+    if mita_credentials is not None and expires_at > time.monotonic():
+        return mita_credentials
+
+    with _mita_credentials_lock:
+        mita_credentials, expires_at = _mita_credentials
+        if mita_credentials is None or expires_at <= time.monotonic():
+            mita_credentials = MitaCredentials.objects.filter(active=True).first()
+            expires_at = time.monotonic() + settings.MITA_CREDENTIALS_CACHE_TTL
+            if mita_credentials is not None:
+                _mita_credentials = (mita_credentials, expires_at)
+
+    return mita_credentials
+
+
+def clear_mita_credentials_cache():
+    global _mita_credentials
+
+    with _mita_credentials_lock:
+        _mita_credentials = (None, 0.0)
+
 
 def send_mita_request(url_ext, payload, client_account):
     # Sends request to mita-api
-    mita_credentials = MitaCredentials.objects.filter(active=True).first()
+    mita_credentials = get_active_mita_credentials()
 
     struct_logger.info(
         event="send_mita_request",
@@ -32,7 +75,13 @@ def send_mita_request(url_ext, payload, client_account):
 
     payload = json.dumps(payload)
 
-    response = requests.request("POST", url, headers=headers, data=payload)
+    session = get_mita_session(mita_url)
+    response = session.post(
+        url,
+        headers=headers,
+        data=payload,
+        timeout=(settings.MITA_HTTP_CONNECT_TIMEOUT, settings.MITA_HTTP_READ_TIMEOUT),
+    )
 
     struct_logger.info(
         event="send_mita_request",
@@ -7,6 +7,7 @@ from .models import (
     OEEfrisGoodsConfiguration,
     OEEfrisGoodsAdjustment,
     OEOutgoingInvoice,
+    OEProductSync,
 )
 
 # ---- Optional branding (you can also use UNFOLD settings in settings.py) ----
@@ -102,3 +103,14 @@ class OEOutgoingInvoiceAdmin(ModelAdmin):
         # If the base model defines invoice_number or similar, show it; else show ID.
         return getattr(obj, "invoice_number", f"Invoice #{obj.id}")
     safe_invoice_number.short_description = "Invoice Number"
+
+
+# ---------- Product Sync ----------
+@admin.register(OEProductSync)
+class OEProductSyncAdmin(ModelAdmin):
+    list_display = ("product_code", "client_account", "status", "date_modified")
+    search_fields = ("product_code",)
+    list_filter = ("status", "client_account")
+    readonly_fields = ("date_modified",)
+    ordering = ("-date_modified",)
+    list_per_page = 50
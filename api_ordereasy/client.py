@@ -0,0 +1,96 @@
+import structlog
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+
+from api_ordereasy.models import OEEfrisClientCredentials
+from taxmoja.services import TTLCache, get_pooled_session
+
+
+struct_logger = structlog.get_logger(__name__)
+
+# Products per page requested from the ordereasy list endpoints
+OE_PAGE_SIZE = 500
+
+# Clients by credentials pk, saving the credentials drops the entry
+_oe_clients = TTLCache(settings.OE_CLIENT_CACHE_TTL)
+
+
+def clear_oe_client(client_id):
+    _oe_clients.pop(client_id)
+
+
+class OEClient:
+    # One client's credentials plus the pooled session for its ordereasy url.
+    # Clients are cached per account, get one with for_client.
+
+    def __init__(self, client_data):
+        self.client_data = client_data
+        self.base_url = client_data.oe_url
+        self.session = get_pooled_session(
+            self.base_url, pool_size=settings.OE_HTTP_POOL_SIZE
+        )
+        self.headers = {"X-OrderEazi-Key": client_data.oe_api_key}
+
+    @classmethod
+    def for_client(cls, client_acc_id):
+        client = _oe_clients.get(int(client_acc_id))
+        if client is None:
+            client = cls(
+                get_object_or_404(OEEfrisClientCredentials, pk=client_acc_id)
+            )
+            _oe_clients.set(client.client_data.pk, client)
+        return client
+
+    def get(self, url: str):
+        try:
+            url = "{}/{}".format(self.base_url, url)
+
+            response = self.session.get(
+                url,
+                headers=self.headers,
+                timeout=(settings.OE_HTTP_CONNECT_TIMEOUT, settings.OE_HTTP_READ_TIMEOUT),
+            )
+
+            # The key header is never logged and the body only up to
+            # OE_LOG_RESPONSE_CHARS, product lists run to megabytes
+            struct_logger.info(
+                event="send_oe_request",
+                url=url,
+                status_code=response.status_code,
+                response_size=len(response.content),
+                response=response.text[: settings.OE_LOG_RESPONSE_CHARS],
+                msg="Sending ordereasy request",
+            )
+
+            return response.json()
+
+        except Exception as ex:
+            return {"message": "Ordereasy API is unvailable {}".format(str(ex))}
+
+    def iter_pages(self, url: str, page_size=OE_PAGE_SIZE):
+        # Yields the Data list of every page of a list endpoint. Stops on a
+        # short page, or when a page repeats the previous one in case the
+        # endpoint ignores the paging parameters.
+        separator = "&" if "?" in url else "?"
+        page = 1
+        previous_first = None
+        while True:
+            response = self.get(
+                "{}{}page={}&pageSize={}".format(url, separator, page, page_size)
+            )
+            if "Data" not in response:
+                raise ValueError(
+                    "Ordereasy list {} page {} failed: {}".format(url, page, response)
+                )
+
+            items = response["Data"] or []
+            if not items or items[0] == previous_first:
+                return
+
+            yield items
+
+            if len(items) < page_size:
+                return
+            previous_first = items[0]
+            page += 1
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_ordereasy', '0003_oeefrisclientcredentials_stock_configuration_commodity_category_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OEProductSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_code', models.CharField(max_length=255)),
+                ('payload_hash', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('SUCCESS', 'Success'), ('FAILED', 'Failed')], max_length=20)),
+                ('response', models.TextField(blank=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('client_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_ordereasy.oeefrisclientcredentials')),
+            ],
+            options={
+                'verbose_name': 'Product Sync',
+                'verbose_name_plural': 'Product Syncs',
+                'unique_together': {('client_account', 'product_code')},
+            },
+        ),
+    ]
@@ -73,6 +73,31 @@ class OEOutgoingInvoice(EfrisOutgoingInvoice):
         verbose_name_plural = "Invoices"
 
 
+class OEProductSync(models.Model):
+    # Outcome of the last bulk configuration of a product, products mita
+    # accepted are skipped on reruns until their payload changes
+    SUCCESS = "SUCCESS"
+    FAILED = "FAILED"
+    STATUS_CHOICES = ((SUCCESS, "Success"), (FAILED, "Failed"))
+
+    client_account = models.ForeignKey(
+        OEEfrisClientCredentials, on_delete=models.CASCADE
+    )
+    product_code = models.CharField(max_length=255)
+    payload_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    response = models.TextField(blank=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Product Sync"
+        verbose_name_plural = "Product Syncs"
+        unique_together = [("client_account", "product_code")]
+
+    def __str__(self):
+        return self.product_code
+
+
 @receiver(post_save, sender=OEEfrisGoodsAdjustment)
 def create_efris_goods_adjustment(sender, instance, **kwargs):
     from .efris import create_xero_goods_adjustment
@@ -85,3 +110,10 @@ def create_efris_goods_configuration(sender, instance, **kwargs):
     from .efris import create_xero_goods_configuration
 
     # create_xero_goods_configuration(instance.__dict__)
+
+
+@receiver(post_save, sender=OEEfrisClientCredentials)
+def clear_oe_client(sender, instance, **kwargs):
+    from .client import clear_oe_client
+
+    clear_oe_client(instance.pk)
@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 import structlog
-import requests
 from api_dear.models import DearEfrisClientCredentials
 from api_mita.services import send_mita_request
-from .models import OEEfrisClientCredentials
+from manager_invoice.services import queue_mita_invoice
+from taxmoja.services import map_concurrently, payload_hash
+from .client import OEClient
+from .models import OEProductSync
 
 
 struct_logger = structlog.get_logger(__name__)
@@ -13,7 +16,7 @@ struct_logger = structlog.get_logger(__name__)
 def process_invoice(response, client_acc_id):
     try:
         # Get local client
-        client_data = get_object_or_404(OEEfrisClientCredentials, pk=client_acc_id)
+        client_data = OEClient.for_client(client_acc_id).client_data
         # retrieving invoice data
         invoice_data = response
 
@@ -72,8 +75,8 @@ def process_invoice(response, client_acc_id):
 
         struct_logger.info(
             event="oe_invoice_processing",
-            message="Sending invoice to mita",
-            response=tax_invoice,
+            message="Invoice queued for mita",
+            response=str(tax_invoice),
         )
 
         return tax_invoice
@@ -179,34 +182,8 @@ def process_credit_note(response, client_acc_id):
 
 
 def send_oe_api_request(url: str, client_acc_id):
-    try:
-        client_data = get_object_or_404(OEEfrisClientCredentials, pk=client_acc_id)
-        url = "{}/{}".format(client_data.oe_url, url)
-
-        payload = {}
-        headers = {"X-OrderEazi-Key": client_data.oe_api_key}
-
-        struct_logger.info(
-            event="send_oe_request",
-            url=url,
-            header=headers,
-            msg="Sending ordereasy request",
-        )
-
-        response = requests.request("GET", url, headers=headers, data=payload)
-
-        struct_logger.info(
-            event="send_oe_request",
-            url=url,
-            header=headers,
-            response=response.text,
-            msg="Sending ordereasy request",
-        )
-
-        return response.json()
-
-    except Exception as ex:
-        return {"message": "Ordereasy API is unvailable {}".format(str(ex))}
+    # Kept for callers holding only the id, the client behind it is cached
+    return OEClient.for_client(client_acc_id).get(url)
 
 
 def clean_currency_product(currency):
@@ -336,52 +313,60 @@ def create_efris_invoice(
         "instance_invoice_id": invoice_code,
     }
     struct_logger.info(event="sending dear invoice to mita", mita_payload=mita_payload)
-    return send_mita_request("invoice/queue", mita_payload, client_data)
+    return queue_mita_invoice(
+        mita_payload, client_data, "ORDEREASY", origin_request_data=invoice_data
+    )
+
+
+def oe_goods_payload(product, client_data):
+    # Mita stock configuration for an ordereasy product, the client defaults
+    # are overridden by the product's FinProductKeyValues
+    goods_name = product["Code"]
+    goods_code = product["Code"]
+    description = product["Description"]
+    measure_unit = client_data.stock_configuration_measure_unit
+    currency = client_data.stock_configuration_currency
+    unit_price = client_data.stock_configuration_unit_price
+    commodity_category = client_data.stock_configuration_commodity_category
+
+    try:
+        efris_key_values = product["FinProductKeyValues"]
+
+        for efris_key in efris_key_values:
+            for key, value in efris_key.items():
+                if value == "URA-MEASURE-UNIT":
+                    measure_unit = efris_key["Value"]
+                elif value == "URA-COMMODITY-CATEGORY":
+                    commodity_category = efris_key["Value"]
+                elif value == "CURRENCY":
+                    currency = efris_key["Value"]
+                elif value == "UNIT-PRICE":
+                    unit_price = efris_key["Value"]
+    except Exception as ex:
+        pass
+    efris_stock_configuration_payload = {
+        "goods_name": goods_name,
+        "goods_code": goods_code,
+        "unit_price": unit_price,
+        "measure_unit": measure_unit,
+        "currency": currency,
+        "commodity_tax_category": commodity_category,
+        "goods_description": description,
+    }
+
+    return efris_stock_configuration_payload
 
 
 def create_goods_configuration(request, client_acc_id):
     # Get local client
-    client_data = get_object_or_404(OEEfrisClientCredentials, pk=client_acc_id)
+    client_data = OEClient.for_client(client_acc_id).client_data
     try:
         struct_logger.info(
             event="create_oe_goods_configuration",
             product=request,
         )
 
-        goods_name = request["Code"]
-        goods_code = request["Code"]
-        description = request["Description"]
-        measure_unit = client_data.stock_configuration_measure_unit
-        currency = client_data.stock_configuration_currency
-        unit_price = client_data.stock_configuration_unit_price
-        commodity_category = client_data.stock_configuration_commodity_category
-
-        try:
-            efris_key_values = request["FinProductKeyValues"]
-
-            for efris_key in efris_key_values:
-                for key, value in efris_key.items():
-                    if value == "URA-MEASURE-UNIT":
-                        measure_unit = efris_key["Value"]
-                    elif value == "URA-COMMODITY-CATEGORY":
-                        commodity_category = efris_key["Value"]
-                    elif value == "CURRENCY":
-                        currency = efris_key["Value"]
-                    elif value == "UNIT-PRICE":
-                        unit_price = efris_key["Value"]
-                    else:
-                        print(efris_key["Value"])
-        except Exception as ex:
-            pass
-        efris_stock_configuration_payload = {
-            "goods_name": goods_name,
-            "goods_code": goods_code,
-            "unit_price": unit_price,
-            "measure_unit": measure_unit,
-            "currency": currency,
-            "commodity_tax_category": commodity_category,
-            "goods_description": description,
-        }
+        efris_stock_configuration_payload = oe_goods_payload(request, client_data)
 
         struct_logger.info(
             event="create_dear_goods_configuration",
@@ -410,27 +395,81 @@ def create_goods_configuration(request, client_acc_id):
 
 
 def create_bulk_stock_configuration(client_acc_id):
-    try:
-        # no provision on the interface
-        product_data = send_oe_api_request("product/list", client_acc_id)
+    # Streams the product list page by page into mita on OE_MITA_WORKERS
+    # threads and records every product's outcome. Products mita already
+    # accepted with the same payload are skipped.
+    oe = OEClient.for_client(client_acc_id)
+    client_data = oe.client_data
+    results = {"configured": 0, "unchanged": 0, "failed": 0}
+
+    def pending_products():
+        for products in oe.iter_pages("product/list"):
+            entries = []
+            for product in products:
+                try:
+                    payload = oe_goods_payload(product, client_data)
+                except KeyError as ex:
+                    results["failed"] += 1
+                    struct_logger.error(
+                        event="create_oe_goods_configuration_bulk",
+                        product=product,
+                        error="missing field {}".format(ex),
+                    )
+                    continue
+                entries.append((payload, payload_hash(payload)))
+
+            succeeded = dict(
+                OEProductSync.objects.filter(
+                    client_account=client_data,
+                    product_code__in=[payload["goods_code"] for payload, _ in entries],
+                    status=OEProductSync.SUCCESS,
+                ).values_list("product_code", "payload_hash")
+            )
+            for payload, product_hash in entries:
+                if succeeded.get(payload["goods_code"]) == product_hash:
+                    results["unchanged"] += 1
+                    continue
+                yield payload, product_hash
 
-        products = product_data["Data"]
+    def configure_product(entry):
+        payload, _ = entry
+        return send_mita_request("stock/configuration", payload, client_data)
 
-        for product in products:
-            configuration = create_goods_configuration(product, client_acc_id)
+    try:
+        for (payload, product_hash), efris_response in map_concurrently(
+            configure_product, pending_products(), max_workers=settings.OE_MITA_WORKERS
+        ):
+            if getattr(efris_response, "ok", False):
+                status = OEProductSync.SUCCESS
+                results["configured"] += 1
+            else:
+                status = OEProductSync.FAILED
+                results["failed"] += 1
+
+            response = getattr(efris_response, "text", str(efris_response))
+            OEProductSync.objects.update_or_create(
+                client_account=client_data,
+                product_code=payload["goods_code"],
+                defaults={
+                    "payload_hash": product_hash,
+                    "status": status,
+                    "response": response[:2000],
+                },
+            )
 
             struct_logger.info(
                 event="create_oe_goods_configuration_bulk",
-                product=product,
-                response=configuration,
-                message="Could not configure product from order east",
+                goods_code=payload["goods_code"],
+                status=status,
+                response=response[:500],
             )
 
-        return True
+        return results
 
     except Exception as ex:
         struct_logger.error(
             event="create_oe_goods_configuration_bulk",
             error=str(ex),
+            results=results,
             message="Could not configure product from order east",
         )
@@ -68,6 +68,9 @@ class QuickbooksEfrisClientCredentialsAdmin(ModelAdmin):
                 "stock_configuration_commodity_category",
             )
         }),
+        ("Change Data Capture", {
+            "fields": ("cdc_polling", "cdc_changed_since")
+        }),
         ("Internal", {"fields": ("quick_books_id",)}),
     )
 
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api_quickbooks.models import QuickbooksEfrisClientCredentials
+from api_quickbooks.services import poll_changed_entities
+
+
+class Command(BaseCommand):
+    help = (
+        "Polls quickbooks change data capture for every client with cdc polling "
+        "enabled and processes the changed invoices, credit memos, items and customers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Poll every client once and exit"
+        )
+        parser.add_argument(
+            "--client", type=int, help="Poll only this client, even if not enabled"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if options["client"]:
+                clients = QuickbooksEfrisClientCredentials.objects.filter(
+                    pk=options["client"]
+                )
+            else:
+                clients = QuickbooksEfrisClientCredentials.objects.filter(
+                    cdc_polling=True
+                )
+
+            for client_data in clients:
+                try:
+                    responses = poll_changed_entities(client_data)
+                except Exception as ex:
+                    self.stderr.write(
+                        "Polling {} failed: {}".format(client_data.company_name, ex)
+                    )
+                    continue
+
+                if responses:
+                    self.stdout.write(
+                        "Processed {} changes for {}".format(
+                            len(responses), client_data.company_name
+                        )
+                    )
+
+            if options["once"]:
+                return
+
+            time.sleep(settings.QUICKBOOKS_CDC_INTERVAL)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_quickbooks', '0006_quickbooksefrisclientcredentials_stock_configuration_commodity_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickbooksefrisclientcredentials',
+            name='access_token_expiry',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_quickbooks', '0007_quickbooksefrisclientcredentials_access_token_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickbooksefrisclientcredentials',
+            name='cdc_polling',
+            field=models.BooleanField(default=False, help_text='Poll quickbooks change data capture instead of relying on webhooks'),
+        ),
+        migrations.AddField(
+            model_name='quickbooksefrisclientcredentials',
+            name='cdc_changed_since',
+            field=models.DateTimeField(blank=True, help_text='Changes up to this time were polled', null=True),
+        ),
+    ]
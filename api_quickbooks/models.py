@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from oauth2.models import OAuth2ClientCredentials
 
 from manager_efris.models import ClientCredentials
@@ -31,6 +33,7 @@ class QuickbooksEfrisClientCredentials(ClientCredentials, OAuth2ClientCredential
     refresh_token_expiry = models.CharField(
         max_length=10, blank=True, null=True, default="NONE"
     )
+    access_token_expiry = models.DateTimeField(blank=True, null=True)
     cashier = models.CharField(
         max_length=100, blank=True, null=True, default="SYSTEM"
     )
@@ -42,6 +45,13 @@ class QuickbooksEfrisClientCredentials(ClientCredentials, OAuth2ClientCredential
         max_length=200, null=True, blank=True)
     stock_configuration_commodity_category = models.CharField(
         max_length=200, null=True, blank=True)
+    cdc_polling = models.BooleanField(
+        default=False,
+        help_text="Poll quickbooks change data capture instead of relying on webhooks",
+    )
+    cdc_changed_since = models.DateTimeField(
+        blank=True, null=True, help_text="Changes up to this time were polled"
+    )
 
     class Meta:
         verbose_name = "Credentials"
@@ -51,6 +61,13 @@ class QuickbooksEfrisClientCredentials(ClientCredentials, OAuth2ClientCredential
         return self.company_name
 
 
+@receiver(post_save, sender=QuickbooksEfrisClientCredentials)
+def clear_quickbooks_token(sender, instance, **kwargs):
+    from .tokens import clear_quickbooks_token_cache
+
+    clear_quickbooks_token_cache(instance.pk)
+
+
 class Bearer:
     def __init__(
         self,
@@ -0,0 +1,104 @@
+import datetime
+import threading
+import structlog
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api_quickbooks.models import QuickbooksEfrisClientCredentials
+from taxmoja.services import advisory_xact_lock
+
+struct_logger = structlog.get_logger(__name__)
+
+# First key of the postgres advisory lock taken while refreshing a client's
+# token, the second key is the client pk
+QUICKBOOKS_TOKEN_LOCK_NAMESPACE = 7302
+
+_quickbooks_tokens = {}
+_quickbooks_token_locks = {}
+_quickbooks_tokens_lock = threading.Lock()
+
+
+def _client_token_lock(client_id):
+    with _quickbooks_tokens_lock:
+        return _quickbooks_token_locks.setdefault(client_id, threading.Lock())
+
+
+def _token_is_fresh(access_token, access_token_expiry, stale_token=None):
+    if not access_token or access_token == stale_token or access_token_expiry is None:
+        return False
+    margin = datetime.timedelta(seconds=settings.QUICKBOOKS_TOKEN_REFRESH_MARGIN)
+    return access_token_expiry - timezone.now() > margin
+
+
+def _refresh_quickbooks_token(client_data, stale_token=None):
+    # Reloads the stored tokens under the advisory lock, another process may
+    # already have refreshed them while we waited
+    from api_quickbooks.services import refresh_token_request
+
+    with transaction.atomic():
+        advisory_xact_lock(QUICKBOOKS_TOKEN_LOCK_NAMESPACE, client_data.pk)
+        stored = QuickbooksEfrisClientCredentials.objects.get(pk=client_data.pk)
+
+        if not _token_is_fresh(
+            stored.access_token, stored.access_token_expiry, stale_token
+        ):
+            if refresh_token_request(stored) is None:
+                struct_logger.error(
+                    event="refresh_quickbooks_token",
+                    client_account=client_data.pk,
+                    error="refresh failed, using the stored access token",
+                )
+                return stored.access_token, None
+
+            struct_logger.info(
+                event="refresh_quickbooks_token", client_account=client_data.pk
+            )
+
+    client_data.access_token = stored.access_token
+    client_data.refresh_token = stored.refresh_token
+    client_data.access_token_expiry = stored.access_token_expiry
+
+    return stored.access_token, stored.access_token_expiry
+
+
+def get_quickbooks_access_token(client_data, stale_token=None):
+    # Returns a bearer token valid for at least QUICKBOOKS_TOKEN_REFRESH_MARGIN
+    # seconds. Pass the token a request was rejected with as stale_token to
+    # force a refresh unless someone already replaced it.
+    client_id = client_data.pk
+    access_token, access_token_expiry = _quickbooks_tokens.get(client_id, (None, None))
+
+    if _token_is_fresh(access_token, access_token_expiry, stale_token):
+        return access_token
+
+    with _client_token_lock(client_id):
+        access_token, access_token_expiry = _quickbooks_tokens.get(
+            client_id, (None, None)
+        )
+        if _token_is_fresh(access_token, access_token_expiry, stale_token):
+            return access_token
+
+        if _token_is_fresh(
+            client_data.access_token, client_data.access_token_expiry, stale_token
+        ):
+            access_token = client_data.access_token
+            access_token_expiry = client_data.access_token_expiry
+        else:
+            access_token, access_token_expiry = _refresh_quickbooks_token(
+                client_data, stale_token
+            )
+
+        if access_token_expiry is not None:
+            _quickbooks_tokens[client_id] = (access_token, access_token_expiry)
+
+    return access_token
+
+
+def clear_quickbooks_token_cache(client_id=None):
+    with _quickbooks_tokens_lock:
+        if client_id is None:
+            _quickbooks_tokens.clear()
+        else:
+            _quickbooks_tokens.pop(client_id, None)
@@ -1,6 +1,8 @@
+import datetime
 import json
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, render, redirect
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
 import structlog
@@ -34,12 +36,10 @@ def webhook(request, client_acc_id):
         if not request:
             return HttpResponse(status=200)
 
-        response = oauth2(request, client_acc_id)
-        struct_logger.info(
-            event="oauth2",
-            response=response,
-            item="refreshing access token",
-        )
+        # Polled clients get these changes through change data capture,
+        # processing them here too would send them to mita twice
+        if client_data.cdc_polling:
+            return HttpResponse(status=200)
 
         mita_response = services.process_webhook(request_body, client_data)
 
@@ -149,6 +149,9 @@ def callback(request, client_acc_id):
 
         client_data.access_token = auth_client.access_token
         client_data.refresh_token = auth_client.refresh_token
+        client_data.access_token_expiry = timezone.now() + datetime.timedelta(
+            seconds=int(auth_client.expires_in)
+        )
 
         client_data.save()
 
@@ -9,6 +9,8 @@ from .models import (
     XeroEfrisGoodsConfiguration,
     XeroEfrisGoodsAdjustment,
     XeroIncomingInvoice,
+    XeroGoodsSync,
+    XeroWebhookEvent,
 )
 
 # --- Optional quick branding (or use UNFOLD settings in settings.py) ---
@@ -108,10 +110,13 @@ class XeroEfrisGoodsConfigurationAdmin(ModelAdmin):
         "currency",
         "measure_unit",
         "client_account",
+        "xero_status",
+        "mita_status",
     )
     search_fields = ("goods_name", "goods_code", "commodity_tax_category")
-    list_filter = ("commodity_tax_category", "currency", "measure_unit", "client_account")
+    list_filter = ("xero_status", "mita_status", "commodity_tax_category", "currency", "measure_unit", "client_account")
     ordering = ("goods_name",)
+    readonly_fields = ("xero_status", "mita_status", "sync_error", "date_queued")
     # keep ID editable if needed; if you prefer read-only and you do have an AutoField 'id', add: readonly_fields = ("id",)
 
 
@@ -127,10 +132,12 @@ class XeroEfrisGoodsAdjustmentAdmin(ModelAdmin):
         "xero_invoice_type",
         "safe_quantity",
         "safe_amount",
+        "sync_status",
     )
     search_fields = ("good__goods_name",)
-    list_filter = ("xero_invoice_type",)
+    list_filter = ("xero_invoice_type", "sync_status")
     ordering = ("-pk",)
+    readonly_fields = ("sync_status", "sync_error", "date_queued")
 
     # Guard access to optional fields that may live on the abstract/base model
     def safe_quantity(self, obj):
@@ -185,3 +192,23 @@ class XeroIncomingInvoiceAdmin(ModelAdmin):
                 return getattr(obj, f)
         return "—"
     safe_total.short_description = "Total"
+
+
+# ===============
+# Webhook Events
+# ===============
+
+@admin.register(XeroWebhookEvent)
+class XeroWebhookEventAdmin(ModelAdmin):
+    list_display = ("pk", "client_account", "status", "date_created", "date_modified")
+    list_filter = ("status", "client_account")
+    ordering = ("-pk",)
+    readonly_fields = ("date_created", "date_modified")
+
+
+@admin.register(XeroGoodsSync)
+class XeroGoodsSyncAdmin(ModelAdmin):
+    list_display = ("pk", "client_account", "status", "items_done", "items_failed", "date_modified")
+    list_filter = ("status", "client_account")
+    ordering = ("-pk",)
+    readonly_fields = ("date_created", "date_modified")
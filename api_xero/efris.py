@@ -1,4 +1,4 @@
-from http.client import BAD_REQUEST, HTTPResponse
+from http.client import BAD_REQUEST
 import os
 import structlog
 from django.http import HttpResponse
@@ -6,152 +6,580 @@ import json
 import base64
 import dateutil.parser
 from xero import Xero
-from manager_efris.models import (
-    EfrisCommodityCategories,
-    EfrisCurrencyCodes,
-    EfrisMeasureUnits,
+from manager_efris.models import EfrisGoodsConfiguration
+from api_xero.models import (
+    XeroEfrisGoodsAdjustment,
+    XeroEfrisGoodsConfiguration,
+    XeroGoodsSync,
+    XeroGoodsSyncItem,
+    XeroWebhookEvent,
 )
-from api_xero.models import XeroEfrisClientCredentials, XeroEfrisGoodsConfiguration
-from xero.auth import OAuth2Credentials
 from api_mita.services import send_mita_request
+from manager_invoice.services import mita_invoice_queued, queue_mita_invoice
+from taxmoja.services import TTLCache, map_concurrently, payload_hash, run_in_background
+from api_xero.tokens import get_xero_credentials
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 import datetime
+import itertools
+import threading
 struct_logger = structlog.get_logger(__name__)
 
+# Largest page xero returns from its list endpoints
+XERO_PAGE_SIZE = 100
+# Items between two saved checkpoints of a goods sync
+XERO_SYNC_CHECKPOINT = 25
+
+_xero_item_writer = None
+_xero_item_writer_lock = threading.Lock()
+
+# Stock-in contact per client pk, stored with the contact id it was resolved
+# from so changing xero_stock_in_contact_account resolves the new one
+_xero_stock_in_contacts = TTLCache(settings.XERO_CONTACT_CACHE_TTL)
+
+
+def get_xero_stock_in_contact(xero, client_data):
+    # Returns the contact stock adjustments are billed to. The configured
+    # contact is fetched by id once and cached, falling back to the first
+    # contact of the organisation when none is configured or it is missing.
+    contact_id = (client_data.xero_stock_in_contact_account or "").strip()
+    cached = _xero_stock_in_contacts.get(client_data.pk)
+    if cached is not None and cached[0] == contact_id:
+        return cached[1]
+
+    contacts = []
+    if contact_id:
+        try:
+            contacts = xero.contacts.get(contact_id)
+        except Exception as ex:
+            struct_logger.error(
+                event="get_xero_stock_in_contact",
+                client_account=client_data.pk,
+                contact_id=contact_id,
+                error=str(ex),
+            )
+    if not contacts:
+        contacts = xero.contacts.filter(page=1)
+
+    contact = {"ContactID": contacts[0]["ContactID"], "Name": contacts[0]["Name"]}
+    _xero_stock_in_contacts.set(client_data.pk, (contact_id, contact))
+
+    return contact
+
+
+def clear_xero_stock_in_contact(client_id):
+    _xero_stock_in_contacts.pop(client_id)
+
+
+def defer_goods_signal(func, model, pk):
+    # Runs func on the saved row in the background once the surrounding
+    # transaction commits, so admin saves and imports neither wait on xero
+    # and mita nor hold their transaction open across those calls. The row
+    # stays PENDING until done, process_pending_xero_goods picks up work a
+    # restart dropped.
+    transaction.on_commit(
+        lambda: run_in_background(run_goods_signal, func, model, pk)
+    )
+
+
+def run_goods_signal(func, model, pk):
+    # Reloads the row so the latest committed values are sent
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    return func(instance.__dict__)
+
 
 def create_xero_goods_configuration(good_instance):
+    # Queues the goods on the batched xero item writer, mita gets the goods
+    # once xero has accepted the item
     try:
         struct_logger.info(
             event="create_xero_goods_configuration",
             product=good_instance,
         )
-        goods_name = good_instance["goods_name"]
-        goods_code = good_instance["goods_code"]
-        purchase_price = good_instance["unit_price"]
-        unit_price = good_instance["unit_price"]
-        description = good_instance["description"]
-
-        currency = get_object_or_404(
-            EfrisCurrencyCodes, pk=good_instance["currency_id"]
-        )
-        measure_unit = get_object_or_404(
-            EfrisMeasureUnits, pk=good_instance["measure_unit_id"]
-        )
-        efris_commodity_tax_category = get_object_or_404(
-            EfrisCommodityCategories, pk=good_instance["commodity_tax_category_id"]
-        )
-        client_data = get_object_or_404(
-            XeroEfrisClientCredentials, pk=good_instance["client_account_id"]
+        goods = XeroEfrisGoodsConfiguration.objects.select_related(
+            "client_account", "currency", "measure_unit", "commodity_tax_category"
+        ).get(pk=good_instance["id"])
+
+        if goods.xero_status == "PENDING":
+            get_xero_item_writer().add(goods)
+        elif goods.xero_status == "CREATED" and goods.mita_status == "PENDING":
+            register_goods_with_mita(goods)
+        else:
+            return HttpResponse("Goods {} already handled".format(goods.goods_code))
+
+        return HttpResponse("Goods {} queued for xero".format(goods.goods_code))
+    except Exception as ex:
+        struct_logger.error(
+            event="create_xero_goods_configuration",
+            error=ex,
         )
+        return HttpResponse("Error in Goods Configuration {}   ".format(str(ex)))
 
-        xero_tax_rate = client_data.xero_standard_tax_rate_code
-        if efris_commodity_tax_category.tax_rate == 0.00:
-            xero_tax_rate = client_data.xero_exempt_tax_rate_code
-        xero_purchase_account_code = client_data.xero_purchase_account
-        is_product = True
-        is_purchased = True
-
-        new_product = {
-            "Code": goods_code,
-            "PurchaseDetails": {
-                "UnitPrice": purchase_price,
-                "AccountCode": xero_purchase_account_code,
-                "TaxType": xero_tax_rate,
-            },
-            "SalesDetails": {
-                "UnitPrice": unit_price,
-                "AccountCode": xero_purchase_account_code,
-                "TaxType": xero_tax_rate,
-            },
-            "Name": goods_name,
-            "IsTrackedAsInventory": is_product,
-            "IsSold": True,
-            "IsPurchased": is_purchased,
-        }
 
-        struct_logger.info(
+def send_goods_configuration_to_mita(goods):
+    efris_stock_configuration_payload = efris_goods_payload(
+        goods.goods_name,
+        goods.goods_code,
+        goods.unit_price,
+        goods.measure_unit,
+        goods.currency,
+        goods.commodity_tax_category,
+        goods.description,
+    )
+
+    struct_logger.info(
+        event="create_xero_goods_configuration",
+        efris_product=efris_stock_configuration_payload,
+        account=goods.client_account_id,
+    )
+    return send_mita_request(
+        "stock/configuration", efris_stock_configuration_payload, goods.client_account
+    )
+
+
+def record_xero_item_result(goods, error):
+    # Stores xero's answer for the goods on its row, returns whether the
+    # item was created
+    goods.xero_status = "FAILED" if error else "CREATED"
+    goods.sync_error = error or ""
+    XeroEfrisGoodsConfiguration.objects.filter(pk=goods.pk).update(
+        xero_status=goods.xero_status, sync_error=goods.sync_error
+    )
+
+    if error:
+        struct_logger.error(
             event="create_xero_goods_configuration",
-            client_data=client_data.cred_state,
-            account=good_instance,
+            goods_code=goods.goods_code,
+            error=error,
         )
+        return False
 
-        credentials = xero_client_credentials(client_data)
-        xero = Xero(credentials)
-        item = xero.items.put(new_product)
+    struct_logger.info(
+        event="create_xero_goods_configuration",
+        xero_product=goods.goods_code,
+        account=goods.client_account_id,
+    )
+    return True
 
-        struct_logger.info(
-            event="create_xero_goods_configuration",
-            xero_product=item,
-            account=good_instance,
+
+def register_goods_with_mita(goods):
+    # Sends the goods to mita and stores the outcome on its row
+    try:
+        efris_response = send_goods_configuration_to_mita(goods)
+        error = None if efris_response.ok else efris_response.text
+    except Exception as ex:
+        efris_response = ex
+        error = str(ex)
+
+    goods.mita_status = "FAILED" if error else "REGISTERED"
+    goods.sync_error = (error or "")[:5000]
+    XeroEfrisGoodsConfiguration.objects.filter(pk=goods.pk).update(
+        mita_status=goods.mita_status, sync_error=goods.sync_error
+    )
+
+    return efris_response
+
+
+def xero_goods_written(goods, error):
+    # Result callback of the process-wide item writer
+    if record_xero_item_result(goods, error):
+        register_goods_with_mita(goods)
+
+
+class XeroItemWriter:
+    # Buffers goods configurations per client and creates them in xero with
+    # one items PUT per batch, once batch_size goods are buffered or `delay`
+    # seconds after the first one (never when delay is None, call flush).
+    # on_result(goods, error) is called for every goods with xero's
+    # validation message, or None when the item was created.
+
+    def __init__(self, on_result, batch_size=50, delay=None):
+        self.on_result = on_result
+        self.batch_size = batch_size
+        self.delay = delay
+        self._buffers = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def add(self, goods):
+        client_id = goods.client_account_id
+        batch = None
+
+        with self._lock:
+            buffer = self._buffers.setdefault(client_id, [])
+            buffer.append(goods)
+            if len(buffer) >= self.batch_size:
+                batch = self._take(client_id)
+            elif self.delay is not None and client_id not in self._timers:
+                timer = threading.Timer(self.delay, self._flush_client, [client_id])
+                timer.daemon = True
+                self._timers[client_id] = timer
+                timer.start()
+
+        if batch:
+            self._write(batch)
+
+    def flush(self):
+        with self._lock:
+            batches = [self._take(client_id) for client_id in list(self._buffers)]
+
+        for batch in batches:
+            if batch:
+                self._write(batch)
+
+    def _take(self, client_id):
+        # Called with the lock held
+        timer = self._timers.pop(client_id, None)
+        if timer is not None:
+            timer.cancel()
+        return self._buffers.pop(client_id, [])
+
+    def _flush_client(self, client_id):
+        try:
+            with self._lock:
+                # A size flush may have emptied the buffer since
+                if self._timers.get(client_id) is not threading.current_thread():
+                    return
+                batch = self._take(client_id)
+
+            self._write(batch)
+        finally:
+            connections.close_all()
+
+    def _write(self, batch):
+        client_data = batch[0].client_account
+        try:
+            errors = put_xero_items(client_data, batch)
+        except Exception as ex:
+            struct_logger.error(
+                event="xero_item_writer", client_account=client_data.pk, error=str(ex)
+            )
+            errors = [str(ex)] * len(batch)
+
+        if len(errors) != len(batch):
+            # The answers can no longer be matched to the goods
+            struct_logger.error(
+                event="xero_item_writer",
+                client_account=client_data.pk,
+                sent=len(batch),
+                returned=len(errors),
+            )
+            errors = [
+                "Xero answered {} items for {} sent".format(len(errors), len(batch))
+            ] * len(batch)
+
+        for goods, error in zip(batch, errors):
+            try:
+                self.on_result(goods, error)
+            except Exception as ex:
+                struct_logger.error(
+                    event="xero_item_writer", goods_code=goods.goods_code, error=str(ex)
+                )
+
+
+def get_xero_item_writer():
+    global _xero_item_writer
+
+    with _xero_item_writer_lock:
+        if _xero_item_writer is None:
+            _xero_item_writer = XeroItemWriter(
+                xero_goods_written,
+                batch_size=settings.XERO_ITEM_BATCH_SIZE,
+                delay=settings.XERO_ITEM_BATCH_DELAY,
+            )
+        return _xero_item_writer
+
+
+def xero_item_payload(
+    client_data, goods_code, goods_name, purchase_price, unit_price, commodity_category
+):
+    xero_tax_rate = client_data.xero_standard_tax_rate_code
+    if commodity_category.tax_rate == 0.00:
+        xero_tax_rate = client_data.xero_exempt_tax_rate_code
+    xero_purchase_account_code = client_data.xero_purchase_account
+
+    return {
+        "Code": goods_code,
+        "PurchaseDetails": {
+            "UnitPrice": purchase_price,
+            "AccountCode": xero_purchase_account_code,
+            "TaxType": xero_tax_rate,
+        },
+        "SalesDetails": {
+            "UnitPrice": unit_price,
+            "AccountCode": xero_purchase_account_code,
+            "TaxType": xero_tax_rate,
+        },
+        "Name": goods_name,
+        "IsTrackedAsInventory": True,
+        "IsSold": True,
+        "IsPurchased": True,
+    }
+
+
+def efris_goods_payload(
+    goods_name,
+    goods_code,
+    unit_price,
+    measure_unit,
+    currency,
+    commodity_category,
+    description,
+):
+    return {
+        "goods_name": goods_name,
+        "goods_code": goods_code,
+        "unit_price": str(unit_price),
+        "measure_unit": measure_unit.measure_unit_code,
+        "currency": currency.currency_code,
+        "commodity_tax_category": commodity_category.efris_commodity_category_code,
+        "goods_description": description,
+    }
+
+
+def bulk_create_xero_goods(goods_configurations):
+    # bulk_create refuses multi-table models, so the EfrisGoodsConfiguration
+    # rows are bulk created and the xero rows saved raw on top of them. Raw
+    # saves skip the signals that would call xero and mita per row.
+    parent_fields = [
+        field
+        for field in EfrisGoodsConfiguration._meta.concrete_fields
+        if not field.primary_key
+    ]
+
+    with transaction.atomic():
+        parents = EfrisGoodsConfiguration.objects.bulk_create(
+            [
+                EfrisGoodsConfiguration(
+                    **{
+                        field.attname: getattr(goods, field.attname)
+                        for field in parent_fields
+                    }
+                )
+                for goods in goods_configurations
+            ]
         )
+        for goods, parent in zip(goods_configurations, parents):
+            goods.pk = goods.efrisgoodsconfiguration_ptr_id = parent.pk
+            goods.save_base(raw=True, force_insert=True)
+
+    return goods_configurations
+
+
+def put_xero_items(client_data, goods_configurations):
+    # Creates the goods as xero items in one request. Returns the error
+    # message per goods, None where xero accepted the item.
+    xero = Xero(xero_client_credentials(client_data))
+    items = xero.items.put(
+        [
+            xero_item_payload(
+                client_data,
+                goods.goods_code,
+                goods.goods_name,
+                goods.unit_price,
+                goods.unit_price,
+                goods.commodity_tax_category,
+            )
+            for goods in goods_configurations
+        ],
+        summarize_errors=False,
+    )
 
-        efris_stock_configuration_payload = {
-            "goods_name": goods_name,
-            "goods_code": goods_code,
-            "unit_price": str(unit_price),
-            "measure_unit": measure_unit.measure_unit_code,
-            "currency": currency.currency_code,
-            "commodity_tax_category": efris_commodity_tax_category.efris_commodity_category_code,
-            "goods_description": description,
+    # Without summarized errors xero answers with every item in request order
+    errors = []
+    for item in items:
+        messages = [error.get("Message") for error in item.get("ValidationErrors", [])]
+        errors.append("; ".join(messages) if messages else None)
+
+    return errors
+
+
+def iter_xero_items(xero, since=None):
+    # Yields items page by page, ordered by code so a resumed sync sees them
+    # in the same order. With since only items changed after it are returned
+    # (If-Modified-Since). The items endpoint may ignore paging and answer
+    # with every item, which then counts as the only page.
+    filters = {"order": "Code"}
+    if since is not None:
+        filters["since"] = since
+
+    page = 1
+    first_item_id = None
+    while True:
+        items = xero.items.filter(page=page, **filters)
+        if not items or items[0].get("ItemID") == first_item_id:
+            return
+        first_item_id = items[0].get("ItemID")
+
+        yield from items
+
+        if len(items) != XERO_PAGE_SIZE:
+            return
+        page += 1
+
+
+def start_xero_goods_sync(client_data):
+    # Returns the client's unfinished sync to resume, or a new one fetching
+    # only items changed since the last sync without failures started. A
+    # sync touched within XERO_GOODS_SYNC_STALE seconds is still running and
+    # is returned with started=False.
+    sync = (
+        XeroGoodsSync.objects.filter(client_account=client_data)
+        .exclude(status__in=["COMPLETED", "PARTIAL"])
+        .order_by("-pk")
+        .first()
+    )
+    if sync is None:
+        last_sync = (
+            XeroGoodsSync.objects.filter(
+                client_account=client_data, status="COMPLETED"
+            )
+            .order_by("-pk")
+            .first()
+        )
+        sync = XeroGoodsSync.objects.create(
+            client_account=client_data,
+            modified_since=last_sync.date_created if last_sync else None,
+        )
+        return sync, True
+
+    stale_before = timezone.now() - datetime.timedelta(
+        seconds=settings.XERO_GOODS_SYNC_STALE
+    )
+    started = (
+        XeroGoodsSync.objects.filter(pk=sync.pk)
+        .filter(Q(status="ERROR") | Q(date_modified__lt=stale_before))
+        .update(status="RUNNING", date_modified=timezone.now())
+    )
+    sync.refresh_from_db()
+
+    return sync, bool(started)
+
+
+def run_xero_goods_sync(sync_id):
+    # Streams the client's changed items into mita on XERO_GOODS_SYNC_WORKERS
+    # threads, skipping items whose payload mita already accepted. A resumed
+    # run starts over from the first item, the stored hashes make the items
+    # it already sent cheap to skip. Progress is checkpointed for the status
+    # view only.
+    sync = XeroGoodsSync.objects.select_related("client_account").get(pk=sync_id)
+    client_data = sync.client_account
+
+    efris_commodity_category = "50131701"  # Replace with actual logic
+    currency = "101"  # Replace with actual logic
+    measure_unit = "PP"  # Replace with actual logic
+
+    def goods_payload(item):
+        return {
+            "goods_name": item.get("Name"),
+            "goods_code": item.get("Code"),
+            "unit_price": str(item.get("PurchaseDetails", {}).get("UnitPrice", 0)),
+            "measure_unit": measure_unit,
+            "currency": currency,
+            "commodity_tax_category": efris_commodity_category,
+            "goods_description": item.get("Name"),
         }
 
+    def changed_items(items):
+        # Looks up the stored hashes a page at a time, unchanged items are
+        # counted as done without a mita call
+        nonlocal items_done, items_skipped
+        while True:
+            chunk = [
+                (item, goods_payload(item))
+                for item in itertools.islice(items, XERO_PAGE_SIZE)
+            ]
+            if not chunk:
+                return
+
+            stored_hashes = dict(
+                XeroGoodsSyncItem.objects.filter(
+                    client_account=client_data,
+                    item_code__in=[payload["goods_code"] for _, payload in chunk],
+                ).values_list("item_code", "payload_hash")
+            )
+            for item, payload in chunk:
+                item_hash = payload_hash(payload)
+                if stored_hashes.get(payload["goods_code"]) == item_hash:
+                    items_done += 1
+                    items_skipped += 1
+                    continue
+                yield item, payload, item_hash
+
+    def configure_item(pending_item):
+        item, efris_stock_configuration_payload, item_hash = pending_item
+
         struct_logger.info(
-            event="create_xero_goods_configuration",
+            event="bulk_xero_goods_configuration",
             efris_product=efris_stock_configuration_payload,
-            account=good_instance,
+            item=item,
         )
         efris_response = send_mita_request(
             "stock/configuration", efris_stock_configuration_payload, client_data
         )
-        return HttpResponse(
-            "xero Item saved {}  \n EFRIS Item Saved {} ".format(
-                item, efris_response)
-        )
-    except Exception as ex:
-        struct_logger.error(
-            event="create_xero_goods_configuration",
-            error=ex,
-        )
-        return HttpResponse("Error in Goods Configuration {}   ".format(str(ex)))
 
+        if efris_response.ok and item.get("Code"):
+            XeroGoodsSyncItem.objects.update_or_create(
+                client_account=client_data,
+                item_code=item["Code"],
+                defaults={"payload_hash": item_hash},
+            )
+
+        return efris_response
 
-def efris_bulk_configure_goods(client_data):
+    items_done = 0
+    items_failed = 0
+    items_skipped = 0
+    checkpoint = 0
 
     try:
         credentials = xero_client_credentials(client_data)
         xero = Xero(credentials)
-        items = xero.items.all()
-
-        efris_commodity_category = "50131701"  # Replace with actual logic
-        currency = "101"  # Replace with actual logic
-        measure_unit = "PP"  # Replace with actual logic
+        items = iter_xero_items(xero, since=sync.modified_since)
+
+        for (item, _, _), efris_response in map_concurrently(
+            configure_item,
+            changed_items(items),
+            max_workers=settings.XERO_GOODS_SYNC_WORKERS,
+        ):
+            if isinstance(efris_response, Exception) or not efris_response.ok:
+                items_failed += 1
+                struct_logger.error(
+                    event="bulk_xero_goods_configuration",
+                    item=item.get("Code"),
+                    error=getattr(efris_response, "text", str(efris_response)),
+                )
 
-        for item in items:
+            items_done += 1
 
-            efris_stock_configuration_payload = {
-                "goods_name": item.get("Name"),
-                "goods_code": item.get("Code"),
-                "unit_price": str(item.get("PurchaseDetails", {}).get("UnitPrice", 0)),
-                "measure_unit": measure_unit,
-                "currency": currency,
-                "commodity_tax_category": efris_commodity_category,
-                "goods_description": item.get("Name"),
-            }
+            if items_done - checkpoint >= XERO_SYNC_CHECKPOINT:
+                checkpoint = items_done
+                XeroGoodsSync.objects.filter(pk=sync.pk).update(
+                    items_done=items_done,
+                    items_failed=items_failed,
+                    date_modified=timezone.now(),
+                )
 
-            struct_logger.info(
-                event="bulk_xero_goods_configuration",
-                efris_product=efris_stock_configuration_payload,
-                item=item,
-            )
-            efris_response = send_mita_request(
-                "stock/configuration", efris_stock_configuration_payload, client_data
-            )
+        sync.status = "PARTIAL" if items_failed else "COMPLETED"
+        sync.result = "{} items configured, {} unchanged, {} failed".format(
+            items_done - items_failed - items_skipped, items_skipped, items_failed
+        )
+    except Exception as ex:
+        struct_logger.error(event="bulk_xero_goods_configuration", error=str(ex))
+        sync.status = "ERROR"
+        sync.result = str(ex)
 
-        return {"success": "All items configured successfully"}
+    sync.items_done = items_done
+    sync.items_failed = items_failed
+    sync.save()
 
-    except Exception as e:
-        return {"error": str(e)}
+    return sync
 
 
 def efris_bulk_adjust_goods(client_data):
@@ -193,6 +621,16 @@ def efris_bulk_adjust_goods(client_data):
 
 
 def create_xero_goods_adjustment(good_instance):
+    # The status update claims the adjustment, so the background run and
+    # process_xero_goods never send the same adjustment twice
+    claimed = XeroEfrisGoodsAdjustment.objects.filter(
+        pk=good_instance["id"], sync_status="PENDING"
+    ).update(sync_status="PROCESSING", date_queued=timezone.now())
+    if not claimed:
+        return None
+
+    sync_status = "ERROR"
+    sync_error = ""
     try:
         struct_logger.info(
             event="create_xero_goods_adjustment",
@@ -219,7 +657,7 @@ def create_xero_goods_adjustment(good_instance):
         credentials = xero_client_credentials(client_data)
         xero = Xero(credentials)
 
-        contact = xero.contacts.all()[0]
+        contact = get_xero_stock_in_contact(xero, client_data)
         xero_tax_rate = client_data.xero_standard_tax_rate_code
         if goods_details.commodity_tax_category.tax_rate == 0.00:
             xero_tax_rate = client_data.xero_exempt_tax_rate_code
@@ -274,10 +712,14 @@ def create_xero_goods_adjustment(good_instance):
         mita_stock = send_mita_request(
             "stock/adjustment", efris_stock_adjustment_payload, client_data
         )
+        if mita_stock.ok:
+            sync_status = "DONE"
+        else:
+            sync_error = mita_stock.text
 
-        return HTTPResponse(
+        return HttpResponse(
             "xero Adjustment saved {}  \n Efris Item Saved {} ".format(
-                invoice, mita_stock
+                invoice, mita_stock.text
             )
         )
 
@@ -286,27 +728,158 @@ def create_xero_goods_adjustment(good_instance):
             event="create_xero_goods_adjustment",
             error=str(ex),
         )
+        sync_error = str(ex)
         return HttpResponse("Error in Goods Adjustment {}   ".format(str(ex)))
 
+    finally:
+        XeroEfrisGoodsAdjustment.objects.filter(pk=good_instance["id"]).update(
+            sync_status=sync_status, sync_error=sync_error[:5000]
+        )
+
+
+def process_pending_xero_goods():
+    # Recovers goods and adjustments whose background run or item writer
+    # buffer was lost, e.g. because the worker was restarted. Returns the
+    # number of goods and adjustments retried.
+    retry_before = timezone.now() - datetime.timedelta(
+        seconds=settings.XERO_GOODS_RETRY_AFTER
+    )
+
+    goods_configurations = (
+        XeroEfrisGoodsConfiguration.objects.select_related(
+            "client_account", "currency", "measure_unit", "commodity_tax_category"
+        )
+        .filter(date_queued__lt=retry_before, client_account__isnull=False)
+        .filter(
+            Q(xero_status="PENDING") | Q(xero_status="CREATED", mita_status="PENDING")
+        )
+        .order_by("pk")
+    )
+    writer = XeroItemWriter(xero_goods_written, batch_size=settings.XERO_ITEM_BATCH_SIZE)
+    goods_retried = 0
+    for goods in goods_configurations:
+        goods_retried += 1
+        if goods.xero_status == "PENDING":
+            writer.add(goods)
+        else:
+            register_goods_with_mita(goods)
+    writer.flush()
+
+    # An interrupted adjustment may already be in xero or mita, flag it for
+    # a person to check instead of sending it again
+    XeroEfrisGoodsAdjustment.objects.filter(
+        sync_status="PROCESSING", date_queued__lt=retry_before
+    ).update(
+        sync_status="ERROR",
+        sync_error="Interrupted, check xero and mita before saving it again",
+    )
+
+    adjustment_ids = list(
+        XeroEfrisGoodsAdjustment.objects.filter(
+            sync_status="PENDING", date_queued__lt=retry_before
+        )
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    for adjustment_id in adjustment_ids:
+        run_goods_signal(
+            create_xero_goods_adjustment, XeroEfrisGoodsAdjustment, adjustment_id
+        )
+
+    return goods_retried, len(adjustment_ids)
+
+
+def queue_xero_webhook_event(request, client_data):
+    # Stores a verified event batch and processes it after the response
+    data = json.loads(request.decode("utf8"))
+    if not data.get("events"):
+        # xero's intent to receive check carries no events
+        return None
+
+    webhook_event = XeroWebhookEvent.objects.create(
+        client_account=client_data, payload=data
+    )
+    transaction.on_commit(
+        lambda: run_in_background(process_xero_webhook_event, webhook_event.pk)
+    )
+
+    struct_logger.info(
+        event="queue_xero_webhook_event",
+        webhook_event=webhook_event.pk,
+        event_count=len(data["events"]),
+    )
+
+    return webhook_event
+
+
+def process_xero_webhook_event(event_id):
+    # The status update claims the batch, so a background thread and the
+    # process_xero_webhooks command never process the same batch twice
+    claimed = XeroWebhookEvent.objects.filter(pk=event_id, status="RECEIVED").update(
+        status="PROCESSING", date_modified=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    webhook_event = XeroWebhookEvent.objects.select_related("client_account").get(
+        pk=event_id
+    )
+
+    try:
+        response = xero_send_invoice_data(
+            webhook_event.payload, webhook_event.client_account)
+        webhook_event.status = "PROCESSED" if response.status_code < 400 else "ERROR"
+        webhook_event.result = response.content.decode("utf8")[:5000]
+    except Exception as ex:
+        webhook_event.status = "ERROR"
+        webhook_event.result = str(ex)
+
+    webhook_event.save(update_fields=["status", "result", "date_modified"])
+
+    struct_logger.info(
+        event="process_xero_webhook_event",
+        webhook_event=webhook_event.pk,
+        status=webhook_event.status,
+    )
+
+    return webhook_event
+
+
+def process_pending_xero_webhook_events():
+    # Recovers batches whose background processing never ran or never
+    # finished, e.g. because the worker was restarted
+    retry_before = timezone.now() - datetime.timedelta(
+        seconds=settings.XERO_WEBHOOK_RETRY_AFTER
+    )
+    XeroWebhookEvent.objects.filter(
+        status="PROCESSING", date_modified__lt=retry_before
+    ).update(status="RECEIVED")
+
+    event_ids = XeroWebhookEvent.objects.filter(
+        status="RECEIVED", date_modified__lt=retry_before
+    ).order_by("pk").values_list("pk", flat=True)
+
+    return [process_xero_webhook_event(event_id) for event_id in event_ids]
+
 
 def xero_send_invoice_data(request, client_data):
     try:
-        data = json.loads(request.decode("utf8").replace("'", '"'))
-        data = data["events"][0]
-        invoice_id = data["resourceId"]
-        event_type = data["eventType"]
-        event_category = data["eventCategory"]
-        tenant_id = data["tenantId"]
+        if isinstance(request, dict):
+            data = request
+        else:
+            data = json.loads(request.decode("utf8").replace("'", '"'))
+        invoice_ids_by_tenant = group_xero_invoice_events(data["events"])
 
         struct_logger.info(
             event="xero_incoming_invoice",
             xero_data=data,
-            dt=data,
-            invoice_id=invoice_id,
-            event_type=event_type,
-            event_category=event_category,
+            event_count=len(data["events"]),
+            invoice_ids=invoice_ids_by_tenant,
         )
 
+        if not invoice_ids_by_tenant:
+            return HttpResponse("no invoice events received")
+
         credentials = xero_client_credentials(client_data)
         if credentials is None:
             struct_logger.error(
@@ -316,36 +889,42 @@ def xero_send_invoice_data(request, client_data):
             )
             return HttpResponse("xero credentials not found", status=500)
 
-        credentials.tenant_id = tenant_id
-        xero = Xero(credentials)
-
-        struct_logger.info(
-            event="xero_incoming_invoice",
-            message="retrieving xero invoice",
-            invoice_id=invoice_id,
-            tenant_id=tenant_id,
-        )
+        invoice_count = 0
+        for tenant_id, invoice_ids in invoice_ids_by_tenant.items():
+            credentials.tenant_id = tenant_id
+            xero = Xero(credentials)
 
-        invoices = xero.invoices.get("{}".format(invoice_id))
+            struct_logger.info(
+                event="xero_incoming_invoice",
+                message="retrieving xero invoices",
+                invoice_ids=invoice_ids,
+                tenant_id=tenant_id,
+            )
 
-        struct_logger.info(
-            event="xero_incoming_invoice",
-            message="invoices retrieved",
-            invoice_data=invoices,
-            invoice_count=len(invoices) if invoices else 0,
-        )
+            invoices = fetch_xero_invoices(xero, invoice_ids)
 
-        if not invoices:
-            struct_logger.error(
-                event="xero_send_invoice_data",
-                message="xero returned no invoices",
-                invoice_id=invoice_id,
+            struct_logger.info(
+                event="xero_incoming_invoice",
+                message="invoices retrieved",
+                invoice_data=invoices,
+                invoice_count=len(invoices),
             )
-            return HttpResponse("no invoices returned from xero", status=500)
 
-        generate_mita_invoice(invoices, client_data)
+            if len(invoices) < len(invoice_ids):
+                struct_logger.error(
+                    event="xero_send_invoice_data",
+                    message="xero did not return every invoice",
+                    invoice_ids=invoice_ids,
+                    returned_ids=[invoice["InvoiceID"] for invoice in invoices],
+                )
+
+            generate_mita_invoice(invoices, client_data)
+            invoice_count += len(invoices)
+
+        if not invoice_count:
+            return HttpResponse("no invoices returned from xero", status=500)
 
-        return HttpResponse("invoices retrieved {}".format(invoices))
+        return HttpResponse("invoices retrieved {}".format(invoice_count))
 
     except Exception as ex:
         import traceback
@@ -355,7 +934,48 @@ def xero_send_invoice_data(request, client_data):
             traceback=traceback.format_exc(),
             message="failed to retrieve or process xero invoice",
         )
-        return HttpResponse("invoices not retrieved {}".format(str(ex)))
+        return HttpResponse("invoices not retrieved {}".format(str(ex)), status=500)
+
+
+def group_xero_invoice_events(events):
+    # Deduplicated invoice ids per tenant, in the order xero sent them
+    invoice_ids = {}
+    for event in events:
+        if event["eventCategory"] != "INVOICE":
+            continue
+        invoice_ids.setdefault(event["tenantId"], {})[event["resourceId"]] = None
+
+    return {tenant_id: list(ids) for tenant_id, ids in invoice_ids.items()}
+
+
+def fetch_xero_invoices(xero, invoice_ids):
+    # One IDs filter per XERO_PAGE_SIZE invoices instead of a GET per invoice;
+    # page=1 makes xero include the line items in the list response
+    invoices = []
+    for start in range(0, len(invoice_ids), XERO_PAGE_SIZE):
+        invoices.extend(
+            xero.invoices.filter(
+                IDs=invoice_ids[start:start + XERO_PAGE_SIZE], page=1)
+        )
+
+    # list responses may carry a summary contact, fetch the full contacts
+    # (contact groups and tax number) in bulk as well
+    contact_ids = list(dict.fromkeys(
+        invoice["Contact"]["ContactID"]
+        for invoice in invoices
+        if "ContactGroups" not in invoice["Contact"]
+    ))
+    contacts = {}
+    for start in range(0, len(contact_ids), XERO_PAGE_SIZE):
+        for contact in xero.contacts.filter(
+                IDs=contact_ids[start:start + XERO_PAGE_SIZE], page=1):
+            contacts[contact["ContactID"]] = contact
+
+    for invoice in invoices:
+        invoice["Contact"] = contacts.get(
+            invoice["Contact"]["ContactID"], invoice["Contact"])
+
+    return invoices
 
 
 def generate_mita_invoice(xero_invoices, client_data):
@@ -390,10 +1010,20 @@ def generate_mita_invoice(xero_invoices, client_data):
                     if xero_invoice["CreditNotes"]:
                         struct_logger.info(
                             event="generate_mita_invoice", message="sending credit notes for generation", credit_notes=xero_invoice["CreditNotes"], invoice=xero_invoice)
-                        return generate_mita_credit_note(xero_invoice, client_data)
+                        generate_mita_credit_note(xero_invoice, client_data)
+                        continue
                 except KeyError:
                     pass
 
+                if mita_invoice_queued(
+                        client_data, "XERO", xero_invoice["InvoiceNumber"]):
+                    struct_logger.info(
+                        event="generate_mita_invoice",
+                        message="invoice already queued for mita, skipping",
+                        invoice_number=xero_invoice["InvoiceNumber"],
+                    )
+                    continue
+
                 is_export = False
                 is_priviledged = False
                 goods_details = []
@@ -424,7 +1054,7 @@ def generate_mita_invoice(xero_invoices, client_data):
                             event="Add goods to Mita",
                             error=ex,
                         )
-                        return HttpResponse("Error in invoice generation {}   ".format(str(ex)))
+                        raise
                 mita_payload = {
                     "invoice_details": {
                         "invoice_code": xero_invoice["InvoiceNumber"],
@@ -462,14 +1092,15 @@ def generate_mita_invoice(xero_invoices, client_data):
                 struct_logger.info(
                     event="sending xero invoice to mita", mita_payload=mita_payload
                 )
-                send_mita_request(
-                    "invoice/queue", mita_payload, client_data)
+                queue_mita_invoice(
+                    mita_payload, client_data, "XERO", origin_request_data=xero_invoice)
         except Exception as ex:
+            # skip the failing invoice, the rest of the batch still goes out
             struct_logger.error(
                 event="generate_mita_invoice",
+                invoice_number=xero_invoice.get("InvoiceNumber"),
                 error=ex,
             )
-            return HttpResponse("Error in invoice generation {}   ".format(str(ex)))
 
 
 def generate_mita_credit_note(credited_xero_invoice, client_data):
@@ -488,6 +1119,15 @@ def generate_mita_credit_note(credited_xero_invoice, client_data):
                     xero_invoice["CreditNoteNumber"]),
                 invoice_data=xero_invoice,
             )
+            if mita_invoice_queued(
+                    client_data, "XERO", xero_invoice["CreditNoteNumber"]):
+                struct_logger.info(
+                    event="generate_mita_credit_note",
+                    message="credit note already queued for mita, skipping",
+                    credit_note_number=xero_invoice["CreditNoteNumber"],
+                )
+                continue
+
             credit_notes = xero.creditnotes.get(
                 "{}".format(xero_invoice["ID"]))
 
@@ -595,8 +1235,8 @@ def generate_mita_credit_note(credited_xero_invoice, client_data):
                     event="sending xero credit note to mita", mita_payload=mita_payload
                 )
 
-                send_mita_request(
-                    "invoice/queue", mita_payload, client_data)
+                queue_mita_invoice(
+                    mita_payload, client_data, "XERO", origin_request_data=credit_note)
 
     except Exception as ex:
         struct_logger.error(
@@ -607,13 +1247,8 @@ def generate_mita_credit_note(credited_xero_invoice, client_data):
 
 
 def xero_client_credentials(client_data):
-    cred_state = client_data.cred_state
-    credentials = OAuth2Credentials(**cred_state)
-    if credentials.expired():
-        credentials.refresh()
-        client_data.cred_state = credentials.state
-        client_data.save()
-    return credentials
+    # Token refresh is cached and single-flight per client, see tokens.py
+    return get_xero_credentials(client_data)
 
 
 def get_client_tax_credentials(contact_groups, xero_invoice):
@@ -0,0 +1,236 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api_xero.efris import (
+    XeroItemWriter,
+    bulk_create_xero_goods,
+    record_xero_item_result,
+    register_goods_with_mita,
+)
+from api_xero.models import XeroEfrisClientCredentials, XeroEfrisGoodsConfiguration
+from manager_efris.models import (
+    EfrisCommodityCategories,
+    EfrisCurrencyCodes,
+    EfrisMeasureUnits,
+)
+from taxmoja.services import map_concurrently
+
+
+def stamp_queued(goods_configurations, chunk_size):
+    # Yields the goods while refreshing date_queued a chunk ahead, so
+    # process_xero_goods leaves rows alone while this import works on them
+    for start in range(0, len(goods_configurations), chunk_size):
+        chunk = goods_configurations[start : start + chunk_size]
+        XeroEfrisGoodsConfiguration.objects.filter(
+            pk__in=[goods.pk for goods in chunk]
+        ).update(date_queued=timezone.now())
+        yield from chunk
+
+
+def lookup_map(queryset, *code_fields):
+    # Maps the pk and every code column of the rows to the row, so the csv
+    # may use either
+    lookup = {}
+    for row in queryset:
+        lookup[str(row.pk)] = row
+        for code_field in code_fields:
+            code = getattr(row, code_field)
+            if code:
+                lookup.setdefault(str(code).strip().upper(), row)
+    return lookup
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports xero goods configurations from a csv laid out like "
+        "scripts/goods_config_import.csv, creating the rows in bulk and then "
+        "pushing them to xero in batches and to mita concurrently. Rerunning "
+        "the same file retries rows that did not finish both pushes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Rows per insert and items per xero request",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.XERO_GOODS_SYNC_WORKERS,
+            help="Concurrent mita submissions",
+        )
+        parser.add_argument(
+            "--skip-xero",
+            action="store_true",
+            help="The items already exist in xero, only register them with mita",
+        )
+        parser.add_argument("--skip-mita", action="store_true")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        currencies = lookup_map(
+            EfrisCurrencyCodes.objects.all(), "currency_code", "currency_abbr"
+        )
+        measure_units = lookup_map(
+            EfrisMeasureUnits.objects.all(), "measure_unit_code", "measure_unit_abbr"
+        )
+        categories = lookup_map(
+            EfrisCommodityCategories.objects.all(), "efris_commodity_category_code"
+        )
+        clients = lookup_map(XeroEfrisClientCredentials.objects.all())
+
+        existing = {
+            (goods.client_account_id, goods.goods_code): goods
+            for goods in XeroEfrisGoodsConfiguration.objects.select_related(
+                "client_account", "currency", "measure_unit", "commodity_tax_category"
+            )
+        }
+        seen = set()
+
+        goods_configurations = []
+        retried = []
+        with open(options["csv_path"], newline="") as csv_file:
+            reader = csv.DictReader(csv_file, skipinitialspace=True)
+            for line, row in enumerate(reader, start=2):
+                row = {
+                    key.strip(): (value or "").strip()
+                    for key, value in row.items()
+                    if key
+                }
+                try:
+                    client_data = clients[row["client_account"].upper()]
+                    goods = XeroEfrisGoodsConfiguration(
+                        client_account=client_data,
+                        goods_name=row["goods_name"],
+                        goods_code=row["goods_code"],
+                        unit_price=float(row["unit_price"]),
+                        currency=currencies[row["currency"].upper()],
+                        measure_unit=measure_units[row["measure_unit"].upper()],
+                        commodity_tax_category=categories[
+                            row["commodity_tax_category"].upper()
+                        ],
+                        description=row["description"] or row["goods_name"],
+                    )
+                except (KeyError, ValueError) as ex:
+                    self.stderr.write("Line {}: unknown value {}".format(line, ex))
+                    continue
+
+                key = (client_data.pk, goods.goods_code)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                stored = existing.get(key)
+                if stored is None:
+                    goods_configurations.append(goods)
+                elif stored.xero_status == "CREATED" and stored.mita_status == "REGISTERED":
+                    self.stdout.write(
+                        "Line {}: {} already configured, skipped".format(
+                            line, goods.goods_code
+                        )
+                    )
+                else:
+                    retried.append(stored)
+
+        if not goods_configurations and not retried:
+            raise CommandError("Nothing to import")
+
+        for start in range(0, len(goods_configurations), batch_size):
+            bulk_create_xero_goods(goods_configurations[start : start + batch_size])
+            self.stdout.write(
+                "Created {}/{} goods configurations".format(
+                    min(start + batch_size, len(goods_configurations)),
+                    len(goods_configurations),
+                )
+            )
+
+        if retried:
+            self.stdout.write("Retrying {} unfinished goods".format(len(retried)))
+        goods_configurations += retried
+
+        if options["skip_xero"]:
+            pending = [
+                goods for goods in goods_configurations if goods.xero_status != "CREATED"
+            ]
+            XeroEfrisGoodsConfiguration.objects.filter(
+                pk__in=[goods.pk for goods in pending]
+            ).update(xero_status="CREATED")
+            for goods in pending:
+                goods.xero_status = "CREATED"
+        else:
+            self.push_to_xero(
+                [
+                    goods
+                    for goods in goods_configurations
+                    if goods.xero_status != "CREATED"
+                ],
+                batch_size,
+            )
+
+        if not options["skip_mita"]:
+            # Only goods xero accepted, the rest stay failed for a rerun
+            self.push_to_mita(
+                [
+                    goods
+                    for goods in goods_configurations
+                    if goods.xero_status == "CREATED" and goods.mita_status != "REGISTERED"
+                ],
+                options["workers"],
+                batch_size,
+            )
+
+    def push_to_xero(self, goods_configurations, batch_size):
+        results = {"done": 0, "failed": 0}
+
+        def written(goods, error):
+            results["done"] += 1
+            if not record_xero_item_result(goods, error):
+                results["failed"] += 1
+                self.stderr.write("Xero rejected {}: {}".format(goods.goods_code, error))
+            if results["done"] % batch_size == 0:
+                self.stdout.write(
+                    "Pushed {}/{} items to xero".format(
+                        results["done"], len(goods_configurations)
+                    )
+                )
+
+        writer = XeroItemWriter(written, batch_size=batch_size)
+        for goods in stamp_queued(goods_configurations, batch_size):
+            writer.add(goods)
+        writer.flush()
+
+        self.stdout.write(
+            "Xero push done, {} items, {} failed".format(
+                results["done"], results["failed"]
+            )
+        )
+
+    def push_to_mita(self, goods_configurations, workers, batch_size):
+        done = failed = 0
+        for goods, efris_response in map_concurrently(
+            register_goods_with_mita,
+            stamp_queued(goods_configurations, batch_size),
+            max_workers=workers,
+        ):
+            done += 1
+            if goods.mita_status != "REGISTERED":
+                failed += 1
+                self.stderr.write(
+                    "Mita rejected {}: {}".format(
+                        goods.goods_code,
+                        getattr(efris_response, "text", efris_response),
+                    )
+                )
+            if done % 100 == 0 or done == len(goods_configurations):
+                self.stdout.write(
+                    "Sent {}/{} goods to mita".format(done, len(goods_configurations))
+                )
+
+        self.stdout.write("Mita push done, {} failed".format(failed))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api_xero.efris import process_pending_xero_goods
+
+
+class Command(BaseCommand):
+    help = (
+        "Retries xero goods configurations and adjustments left pending by the "
+        "background workers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Retry pending goods once and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            goods_retried, adjustments_retried = process_pending_xero_goods()
+            if goods_retried or adjustments_retried:
+                self.stdout.write(
+                    "Retried {} goods and {} adjustments".format(
+                        goods_retried, adjustments_retried
+                    )
+                )
+
+            if options["once"]:
+                return
+
+            time.sleep(settings.XERO_GOODS_RETRY_AFTER / 2)
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api_xero.efris import process_pending_xero_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Processes xero webhook batches left unprocessed by the background workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Process pending batches once and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_xero_webhook_events()
+            if processed:
+                self.stdout.write("Processed {} xero event batches".format(len(processed)))
+
+            if options["once"]:
+                return
+
+            time.sleep(settings.XERO_WEBHOOK_RETRY_AFTER / 2)
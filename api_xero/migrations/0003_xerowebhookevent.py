@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0002_xeroincominginvoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XeroWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', jsonfield.fields.JSONField(help_text='Signed event batch as received from xero')),
+                ('status', models.CharField(choices=[('RECEIVED', 'RECEIVED'), ('PROCESSING', 'PROCESSING'), ('PROCESSED', 'PROCESSED'), ('ERROR', 'ERROR')], default='RECEIVED', max_length=20)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('client_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_xero.xeroefrisclientcredentials')),
+            ],
+            options={
+                'verbose_name': 'Webhook Event',
+                'verbose_name_plural': 'Webhook Events',
+                'indexes': [models.Index(fields=['status', 'date_modified'], name='xero_webhook_status_idx')],
+            },
+        ),
+    ]
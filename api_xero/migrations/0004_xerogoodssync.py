@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0003_xerowebhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XeroGoodsSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('RUNNING', 'RUNNING'), ('COMPLETED', 'COMPLETED'), ('ERROR', 'ERROR')], default='RUNNING', max_length=20)),
+                ('items_done', models.PositiveIntegerField(default=0, help_text='Items handled so far, a resumed run skips them')),
+                ('items_failed', models.PositiveIntegerField(default=0)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('client_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_xero.xeroefrisclientcredentials')),
+            ],
+            options={
+                'verbose_name': 'Goods Sync',
+                'verbose_name_plural': 'Goods Syncs',
+            },
+        ),
+    ]
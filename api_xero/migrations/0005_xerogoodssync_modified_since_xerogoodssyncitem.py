@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0004_xerogoodssync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xerogoodssync',
+            name='modified_since',
+            field=models.DateTimeField(blank=True, help_text='Only items changed after this are fetched, empty for a full sync', null=True),
+        ),
+        migrations.CreateModel(
+            name='XeroGoodsSyncItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_code', models.CharField(max_length=255)),
+                ('payload_hash', models.CharField(max_length=64)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('client_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_xero.xeroefrisclientcredentials')),
+            ],
+            options={
+                'verbose_name': 'Goods Sync Item',
+                'verbose_name_plural': 'Goods Sync Items',
+                'unique_together': {('client_account', 'item_code')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0005_xerogoodssync_modified_since_xerogoodssyncitem'),
+    ]
+
+    operations = [
+        # Existing goods went through the old signal, they count as done
+        migrations.AddField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='xero_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('CREATED', 'CREATED'), ('FAILED', 'FAILED')], default='CREATED', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='mita_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('REGISTERED', 'REGISTERED'), ('FAILED', 'FAILED')], default='REGISTERED', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='sync_error',
+            field=models.TextField(blank=True, default='', help_text='Last error from xero or mita'),
+        ),
+        migrations.AlterField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='xero_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('CREATED', 'CREATED'), ('FAILED', 'FAILED')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='mita_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('REGISTERED', 'REGISTERED'), ('FAILED', 'FAILED')], default='PENDING', max_length=20),
+        ),
+    ]
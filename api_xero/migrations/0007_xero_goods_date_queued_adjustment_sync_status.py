@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0006_xeroefrisgoodsconfiguration_sync_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xeroefrisgoodsconfiguration',
+            name='date_queued',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the goods were last queued for xero and mita'),
+        ),
+        # Existing adjustments went through the old signal, they count as done
+        migrations.AddField(
+            model_name='xeroefrisgoodsadjustment',
+            name='sync_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('PROCESSING', 'PROCESSING'), ('DONE', 'DONE'), ('ERROR', 'ERROR')], default='DONE', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='xeroefrisgoodsadjustment',
+            name='sync_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('PROCESSING', 'PROCESSING'), ('DONE', 'DONE'), ('ERROR', 'ERROR')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='xeroefrisgoodsadjustment',
+            name='sync_error',
+            field=models.TextField(blank=True, default='', help_text='Last error from xero or mita'),
+        ),
+        migrations.AddField(
+            model_name='xeroefrisgoodsadjustment',
+            name='date_queued',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the adjustment was last queued for xero and mita'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0007_xero_goods_date_queued_adjustment_sync_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='xerogoodssync',
+            name='status',
+            field=models.CharField(choices=[('RUNNING', 'RUNNING'), ('COMPLETED', 'COMPLETED'), ('PARTIAL', 'PARTIAL'), ('ERROR', 'ERROR')], default='RUNNING', max_length=20),
+        ),
+    ]
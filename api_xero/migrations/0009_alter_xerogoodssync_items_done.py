@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_xero', '0008_alter_xerogoodssync_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='xerogoodssync',
+            name='items_done',
+            field=models.PositiveIntegerField(default=0, help_text='Items handled so far by the current run'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from jsonfield import JSONField
 from oauth2.models import OAuth2ClientCredentials
 
@@ -42,9 +43,37 @@ class XeroEfrisClientCredentials(ClientCredentials, OAuth2ClientCredentials):
 
 
 class XeroEfrisGoodsConfiguration(EfrisGoodsConfiguration):
+    XERO_STATUS = [
+        ("PENDING", "PENDING"),
+        ("CREATED", "CREATED"),
+        ("FAILED", "FAILED"),
+    ]
+    MITA_STATUS = [
+        ("PENDING", "PENDING"),
+        ("REGISTERED", "REGISTERED"),
+        ("FAILED", "FAILED"),
+    ]
+
     client_account = models.ForeignKey(
         XeroEfrisClientCredentials, null=True, blank=True, on_delete=models.SET_NULL
     )
+    xero_status = models.CharField(
+        max_length=20,
+        choices=XERO_STATUS,
+        default="PENDING",
+    )
+    mita_status = models.CharField(
+        max_length=20,
+        choices=MITA_STATUS,
+        default="PENDING",
+    )
+    sync_error = models.TextField(
+        blank=True, default="", help_text="Last error from xero or mita"
+    )
+    date_queued = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the goods were last queued for xero and mita",
+    )
 
     class Meta:
         verbose_name = "Goods Configuration"
@@ -56,6 +85,12 @@ class XeroEfrisGoodsConfiguration(EfrisGoodsConfiguration):
 
 class XeroEfrisGoodsAdjustment(EfrisGoodsAdjustment):
     XERO_ADJUST_CHOICES = [("ACCPAY", "INCREASE"), ("ACCREC", "DECREASE")]
+    SYNC_STATUS = [
+        ("PENDING", "PENDING"),
+        ("PROCESSING", "PROCESSING"),
+        ("DONE", "DONE"),
+        ("ERROR", "ERROR"),
+    ]
 
     good = models.ForeignKey(
         XeroEfrisGoodsConfiguration, null=True, blank=True, on_delete=models.SET_NULL
@@ -66,6 +101,18 @@ class XeroEfrisGoodsAdjustment(EfrisGoodsAdjustment):
         choices=XERO_ADJUST_CHOICES,
         default="ACCPAY",
     )
+    sync_status = models.CharField(
+        max_length=20,
+        choices=SYNC_STATUS,
+        default="PENDING",
+    )
+    sync_error = models.TextField(
+        blank=True, default="", help_text="Last error from xero or mita"
+    )
+    date_queued = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the adjustment was last queued for xero and mita",
+    )
 
     class Meta:
         verbose_name = "Goods Adjustment"
@@ -90,15 +137,130 @@ class XeroIncomingInvoice(EfrisOutgoingInvoice):
         return self.invoice_number or f"Invoice {self.pk}"
 
 
+class XeroWebhookEvent(models.Model):
+    EVENT_STATUS = [
+        ("RECEIVED", "RECEIVED"),
+        ("PROCESSING", "PROCESSING"),
+        ("PROCESSED", "PROCESSED"),
+        ("ERROR", "ERROR"),
+    ]
+
+    client_account = models.ForeignKey(
+        XeroEfrisClientCredentials, on_delete=models.CASCADE
+    )
+    payload = JSONField(help_text="Signed event batch as received from xero")
+    status = models.CharField(
+        max_length=20,
+        choices=EVENT_STATUS,
+        default="RECEIVED",
+    )
+    result = models.TextField(blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Webhook Event"
+        verbose_name_plural = "Webhook Events"
+        indexes = [
+            models.Index(fields=["status", "date_modified"], name="xero_webhook_status_idx"),
+        ]
+
+    def __str__(self):
+        return "Xero event batch {} {}".format(self.pk, self.status)
+
+
+class XeroGoodsSync(models.Model):
+    # PARTIAL runs finished with failed items, only COMPLETED runs move the
+    # modified-since cursor so failed items are fetched again
+    SYNC_STATUS = [
+        ("RUNNING", "RUNNING"),
+        ("COMPLETED", "COMPLETED"),
+        ("PARTIAL", "PARTIAL"),
+        ("ERROR", "ERROR"),
+    ]
+
+    client_account = models.ForeignKey(
+        XeroEfrisClientCredentials, on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=SYNC_STATUS,
+        default="RUNNING",
+    )
+    items_done = models.PositiveIntegerField(
+        default=0, help_text="Items handled so far by the current run"
+    )
+    items_failed = models.PositiveIntegerField(default=0)
+    modified_since = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Only items changed after this are fetched, empty for a full sync",
+    )
+    result = models.TextField(blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Goods Sync"
+        verbose_name_plural = "Goods Syncs"
+
+    def __str__(self):
+        return "Xero goods sync {} {}".format(self.pk, self.status)
+
+
+class XeroGoodsSyncItem(models.Model):
+    # Hash of the last payload mita accepted for an item, unchanged items are
+    # not sent again
+    client_account = models.ForeignKey(
+        XeroEfrisClientCredentials, on_delete=models.CASCADE
+    )
+    item_code = models.CharField(max_length=255)
+    payload_hash = models.CharField(max_length=64)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Goods Sync Item"
+        verbose_name_plural = "Goods Sync Items"
+        unique_together = [("client_account", "item_code")]
+
+    def __str__(self):
+        return self.item_code
+
+
 @receiver(post_save, sender=XeroEfrisGoodsAdjustment)
-def create_efris_goods_adjustment(sender, instance, **kwargs):
-    from .efris import create_xero_goods_adjustment
+def create_efris_goods_adjustment(sender, instance, raw=False, **kwargs):
+    from .efris import create_xero_goods_adjustment, defer_goods_signal
 
-    create_xero_goods_adjustment(instance.__dict__)
+    # Fixtures and raw imports are already in xero and mita
+    if raw:
+        return
+    # The status lets process_xero_goods recover the work if the background
+    # run is lost
+    sender.objects.filter(pk=instance.pk).update(
+        sync_status="PENDING", sync_error="", date_queued=timezone.now()
+    )
+    defer_goods_signal(create_xero_goods_adjustment, sender, instance.pk)
 
 
 @receiver(post_save, sender=XeroEfrisGoodsConfiguration)
-def create_efris_goods_configuration(sender, instance, **kwargs):
-    from .efris import create_xero_goods_configuration
+def create_efris_goods_configuration(sender, instance, raw=False, **kwargs):
+    from .efris import create_xero_goods_configuration, defer_goods_signal
+
+    if raw:
+        return
+    sender.objects.filter(pk=instance.pk).update(
+        xero_status="PENDING",
+        mita_status="PENDING",
+        sync_error="",
+        date_queued=timezone.now(),
+    )
+    defer_goods_signal(create_xero_goods_configuration, sender, instance.pk)
+
+
+@receiver(post_save, sender=XeroEfrisClientCredentials)
+def clear_xero_token(sender, instance, **kwargs):
+    from .efris import clear_xero_stock_in_contact
+    from .tokens import clear_xero_token_cache
 
-    create_xero_goods_configuration(instance.__dict__)
+    clear_xero_token_cache(instance.pk)
+    clear_xero_stock_in_contact(instance.pk)
@@ -0,0 +1,92 @@
+import copy
+import threading
+import time
+import structlog
+
+from django.conf import settings
+from django.db import transaction
+from xero.auth import OAuth2Credentials
+
+from api_xero.models import XeroEfrisClientCredentials
+from taxmoja.services import advisory_xact_lock
+
+struct_logger = structlog.get_logger(__name__)
+
+# First key of the postgres advisory lock taken while refreshing a client's
+# token, the second key is the client pk
+XERO_TOKEN_LOCK_NAMESPACE = 7301
+
+_xero_tokens = {}
+_xero_token_locks = {}
+_xero_tokens_lock = threading.Lock()
+
+
+def _client_token_lock(client_id):
+    with _xero_tokens_lock:
+        return _xero_token_locks.setdefault(client_id, threading.Lock())
+
+
+def _token_is_fresh(cred_state):
+    token = (cred_state or {}).get("token") or {}
+    expires_at = token.get("expires_at")
+    if expires_at is None:
+        return False
+    return expires_at - time.time() > settings.XERO_TOKEN_REFRESH_MARGIN
+
+
+def _refresh_xero_token(client_id):
+    # Reloads the stored state under the advisory lock, another process may
+    # already have refreshed it while we waited
+    with transaction.atomic():
+        advisory_xact_lock(XERO_TOKEN_LOCK_NAMESPACE, client_id)
+        cred_state = (
+            XeroEfrisClientCredentials.objects.only("cred_state")
+            .get(pk=client_id)
+            .cred_state
+        )
+        if _token_is_fresh(cred_state):
+            return cred_state
+
+        credentials = OAuth2Credentials(**cred_state)
+        credentials.refresh()
+        cred_state = credentials.state
+
+        # update() rather than save() so the refresh does not fire post_save
+        XeroEfrisClientCredentials.objects.filter(pk=client_id).update(
+            cred_state=cred_state
+        )
+
+    struct_logger.info(event="refresh_xero_token", client_account=client_id)
+    return cred_state
+
+
+def get_xero_credentials(client_data):
+    # Returns credentials with a token valid for at least
+    # XERO_TOKEN_REFRESH_MARGIN seconds, each caller gets its own copy so
+    # setting tenant_id on it is safe
+    client_id = client_data.pk
+    cred_state = _xero_tokens.get(client_id)
+
+    if not _token_is_fresh(cred_state):
+        with _client_token_lock(client_id):
+            cred_state = _xero_tokens.get(client_id)
+            if not _token_is_fresh(cred_state):
+                if _token_is_fresh(client_data.cred_state):
+                    cred_state = client_data.cred_state
+                elif not (client_data.cred_state or {}).get("token"):
+                    # Not authorised yet, nothing to cache or refresh
+                    return OAuth2Credentials(**client_data.cred_state)
+                else:
+                    cred_state = _refresh_xero_token(client_id)
+                _xero_tokens[client_id] = cred_state
+
+    client_data.cred_state = cred_state
+    return OAuth2Credentials(**copy.deepcopy(cred_state))
+
+
+def clear_xero_token_cache(client_id=None):
+    with _xero_tokens_lock:
+        if client_id is None:
+            _xero_tokens.clear()
+        else:
+            _xero_tokens.pop(client_id, None)
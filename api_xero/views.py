@@ -10,7 +10,7 @@ from urllib.parse import parse_qs
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
 from django.core.cache import caches, cache
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
 from rest_framework import status
@@ -21,7 +21,16 @@ from xero import Xero
 from xero.auth import OAuth2Credentials
 from xero.constants import XeroScopes
 from .models import XeroEfrisClientCredentials
-from .efris import efris_bulk_configure_goods, xero_send_invoice_data, efris_bulk_adjust_goods
+from .efris import (
+    efris_bulk_adjust_goods,
+    queue_xero_webhook_event,
+    run_xero_goods_sync,
+    start_xero_goods_sync,
+    xero_send_invoice_data,
+)
+from taxmoja.services import run_in_background
+
+from django.conf import settings
 
 from django.core.exceptions import BadRequest
 from django.shortcuts import get_object_or_404
@@ -108,8 +117,11 @@ def xero_invoice_webhook(request, client_acc_id):
         )
         status_code = 401
 
-        if header_signature == generated_signature:
-            xero_send_invoice_data(request.body, client_data)
+        if hmac.compare_digest(header_signature, generated_signature):
+            if settings.XERO_WEBHOOK_FAST_ACK:
+                queue_xero_webhook_event(request_data, client_data)
+            else:
+                xero_send_invoice_data(request_data, client_data)
             status_code = 200
 
         return HttpResponse(status=status_code)
@@ -120,9 +132,23 @@ def xero_invoice_webhook(request, client_acc_id):
 
 @csrf_exempt
 def xero_bulk_products_configuration(request, client_acc_id):
+    # Large organisations take longer than a request, the sync runs in the
+    # background and its progress is kept on XeroGoodsSync
     client_data = get_object_or_404(
         XeroEfrisClientCredentials, pk=client_acc_id)
-    return efris_bulk_configure_goods(client_data)
+    sync, started = start_xero_goods_sync(client_data)
+    if started:
+        run_in_background(run_xero_goods_sync, sync.pk)
+
+    return JsonResponse(
+        {
+            "sync": sync.pk,
+            "status": sync.status,
+            "items_done": sync.items_done,
+            "started": started,
+        },
+        status=202,
+    )
 
 
 @csrf_exempt
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from unfold.admin import ModelAdmin
 
+from .models import OutgoingInvoice
 
+
+@admin.register(OutgoingInvoice)
+class OutgoingInvoiceAdmin(ModelAdmin):
+    list_display = (
+        "origin_invoice_id",
+        "app_of_origin",
+        "client_account",
+        "mita_url_ext",
+        "status",
+        "attempts",
+        "mita_upload_code",
+        "modified_date",
+    )
+    search_fields = ("mita_upload_desc",)
+    list_filter = ("status", "app_of_origin", "client_account")
+    ordering = ("-origin_invoice_id",)
+    list_per_page = 50
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manager_invoice.services import dispatch_pending_invoices, release_stale_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends invoices queued in the outbox to mita. Rows are claimed with "
+        "SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can run "
+        "side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.MITA_OUTBOX_WORKERS,
+            help="Concurrent mita submissions per process",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the outbox once and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_stale_invoices()
+            if released:
+                self.stdout.write("Released {} stale invoices".format(released))
+
+            dispatched = dispatch_pending_invoices(
+                options["batch_size"], max_workers=options["workers"]
+            )
+            sent = [invoice for invoice in dispatched if invoice.status == "SENT"]
+
+            if dispatched:
+                self.stdout.write(
+                    "Dispatched {} invoices, {} sent".format(len(dispatched), len(sent))
+                )
+
+            if options["once"] and len(dispatched) < options["batch_size"]:
+                return
+
+            # back off while the outbox is empty or mita keeps failing
+            if not sent:
+                time.sleep(settings.MITA_OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager_efris', '0001_initial'),
+        ('manager_invoice', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outgoinginvoice',
+            name='app_of_origin',
+            field=models.CharField(choices=[('DEAR', 'DEAR'), ('XERO', 'XERO'), ('QUICKBOOKS', 'QUICKBOOKS'), ('ORDEREASY', 'ORDEREASY'), ('GENERIC', 'GENERIC'), ('OTHER', 'OTHER')], default='GENERIC', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='outgoinginvoice',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Number of submissions to mita'),
+        ),
+        migrations.AddField(
+            model_name='outgoinginvoice',
+            name='client_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outgoing_invoices', to='manager_efris.clientcredentials'),
+        ),
+        migrations.AddField(
+            model_name='outgoinginvoice',
+            name='mita_url_ext',
+            field=models.CharField(default='invoice/queue', help_text='Mita endpoint', max_length=200),
+        ),
+    ]
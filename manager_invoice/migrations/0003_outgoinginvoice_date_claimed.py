@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager_invoice', '0002_outgoinginvoice_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoinginvoice',
+            name='date_claimed',
+            field=models.DateTimeField(blank=True, help_text='Last time a worker claimed the invoice', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outgoinginvoice',
+            index=models.Index(fields=['status', 'date_claimed'], name='outgoing_invoice_claim_idx'),
+        ),
+    ]
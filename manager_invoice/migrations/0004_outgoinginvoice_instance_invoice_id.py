@@ -0,0 +1,33 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+def backfill_instance_invoice_id(apps, schema_editor):
+    OutgoingInvoice = apps.get_model('manager_invoice', 'OutgoingInvoice')
+    for invoice in OutgoingInvoice.objects.filter(client_account__isnull=False).iterator():
+        payload = invoice.mita_request_data or {}
+        if isinstance(payload, dict) and payload.get('instance_invoice_id'):
+            OutgoingInvoice.objects.filter(pk=invoice.pk).update(
+                instance_invoice_id=str(payload['instance_invoice_id'])
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager_invoice', '0003_outgoinginvoice_date_claimed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoinginvoice',
+            name='instance_invoice_id',
+            field=models.CharField(blank=True, default='', help_text='Invoice number in the app of origin', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='outgoinginvoice',
+            index=models.Index(fields=['client_account', 'app_of_origin', 'instance_invoice_id'], name='outgoing_invoice_origin_idx'),
+        ),
+        migrations.RunPython(backfill_instance_invoice_id, migrations.RunPython.noop),
+    ]
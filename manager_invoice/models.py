@@ -12,6 +12,8 @@ SENT_STATUS = [
 ORIGIN_APPS = [
     ("DEAR", "DEAR"),
     ("XERO", "XERO"),
+    ("QUICKBOOKS", "QUICKBOOKS"),
+    ("ORDEREASY", "ORDEREASY"),
     ("GENERIC", "GENERIC"),
     ("OTHER", "OTHER"),
 ]
@@ -26,6 +28,8 @@ UPLOAD_CODES = [("200", "SUCCESS"), ("400", "ERROR")]
 class OutgoingInvoice(models.Model):
 
     #handles invoices coming from different apps like xero
+    #rows queued with a client_account form the mita outbox, drained by
+    #manager_invoice.services.dispatch_pending_invoices
 
     origin_invoice_id = models.AutoField(
         primary_key=True, help_text="Instance id from app of origin"
@@ -72,9 +76,42 @@ class OutgoingInvoice(models.Model):
         default="RECEIVED",
     )
 
+    client_account = models.ForeignKey(
+        "manager_efris.ClientCredentials",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="outgoing_invoices",
+    )
+    mita_url_ext = models.CharField(
+        max_length=200, default="invoice/queue", help_text="Mita endpoint"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, help_text="Number of submissions to mita"
+    )
+    date_claimed = models.DateTimeField(
+        blank=True, null=True, help_text="Last time a worker claimed the invoice"
+    )
+    instance_invoice_id = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="Invoice number in the app of origin",
+    )
+
     class Meta:
         verbose_name = "Outgoing Invoice"
         verbose_name_plural = "Incoming Invoices"
+        indexes = [
+            models.Index(fields=["status", "date_claimed"], name="outgoing_invoice_claim_idx"),
+            models.Index(
+                fields=["client_account", "app_of_origin", "instance_invoice_id"],
+                name="outgoing_invoice_origin_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return "Invoice {} {}".format(self.pk, self.status)
 
 
 class Invoice(models.Model):
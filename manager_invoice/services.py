@@ -0,0 +1,210 @@
+import datetime
+
+import structlog
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api_mita.services import send_mita_request
+from taxmoja.services import map_concurrently
+from .models import OutgoingInvoice
+
+
+struct_logger = structlog.get_logger(__name__)
+
+
+def queue_mita_invoice(
+    mita_payload,
+    client_data,
+    app_of_origin,
+    origin_request_data=None,
+    url_ext="invoice/queue",
+):
+    # Persists the invoice in the outbox and returns without waiting on mita.
+    # With MITA_INVOICE_OUTBOX off the row is still recorded but sent inline.
+    today = timezone.now().date()
+
+    outgoing_invoice = OutgoingInvoice.objects.create(
+        app_of_origin=app_of_origin,
+        client_account_id=getattr(client_data, "clientcredentials_ptr_id", client_data.pk),
+        origin_request_data=origin_request_data or {},
+        mita_request_data=mita_payload,
+        mita_response_data={},
+        mita_url_ext=url_ext,
+        country_code=client_data.mita_country_code,
+        issue_date=today,
+        upload_date=today,
+        modified_date=today,
+        status="RECEIVED",
+        instance_invoice_id=str(mita_payload.get("instance_invoice_id", "")),
+    )
+
+    struct_logger.info(
+        event="queue_mita_invoice",
+        outgoing_invoice=outgoing_invoice.pk,
+        app_of_origin=app_of_origin,
+        invoice_code=mita_payload.get("instance_invoice_id"),
+    )
+
+    if not settings.MITA_INVOICE_OUTBOX:
+        dispatch_outgoing_invoice(outgoing_invoice)
+
+    return outgoing_invoice
+
+
+def mita_invoice_queued(client_data, app_of_origin, instance_invoice_id):
+    # True when the invoice is already in the outbox or with mita, so a
+    # replayed webhook doesn't queue it a second time. Failed rows don't
+    # count, those may be sent again.
+    return (
+        OutgoingInvoice.objects.filter(
+            client_account_id=getattr(
+                client_data, "clientcredentials_ptr_id", client_data.pk
+            ),
+            app_of_origin=app_of_origin,
+            instance_invoice_id=str(instance_invoice_id),
+        )
+        .exclude(status="ERROR")
+        .exists()
+    )
+
+
+def dispatch_outgoing_invoice(outgoing_invoice):
+    # Sends one outbox row to mita and records the outcome on the row.
+    # Mita 4xx answers are final, anything else that goes wrong is retried
+    # until MITA_OUTBOX_MAX_ATTEMPTS.
+    outgoing_invoice.attempts += 1
+    outgoing_invoice.modified_date = timezone.now().date()
+    can_retry = outgoing_invoice.attempts < settings.MITA_OUTBOX_MAX_ATTEMPTS
+
+    # Counted before sending, so a worker dying mid-send still uses up the
+    # attempt and release_stale_invoices can give up on the row
+    OutgoingInvoice.objects.filter(pk=outgoing_invoice.pk).update(
+        attempts=outgoing_invoice.attempts
+    )
+
+    if outgoing_invoice.client_account is None:
+        outgoing_invoice.status = "ERROR"
+        outgoing_invoice.mita_upload_desc = "Client account no longer exists"
+        outgoing_invoice.save()
+        return outgoing_invoice
+
+    try:
+        response = send_mita_request(
+            outgoing_invoice.mita_url_ext,
+            outgoing_invoice.mita_request_data,
+            outgoing_invoice.client_account,
+        )
+
+        try:
+            outgoing_invoice.mita_response_data = response.json()
+        except ValueError:
+            outgoing_invoice.mita_response_data = {"response": response.text}
+
+        outgoing_invoice.mita_upload_code = "200" if response.ok else "400"
+        outgoing_invoice.mita_upload_desc = response.text[:1000]
+        outgoing_invoice.upload_date = timezone.now().date()
+
+        if response.ok:
+            outgoing_invoice.status = "SENT"
+        elif response.status_code >= 500 and can_retry:
+            outgoing_invoice.status = "RECEIVED"
+        else:
+            outgoing_invoice.status = "ERROR"
+
+        outgoing_invoice.save()
+    except Exception as ex:
+        struct_logger.error(
+            event="dispatch_outgoing_invoice",
+            outgoing_invoice=outgoing_invoice.pk,
+            attempts=outgoing_invoice.attempts,
+            error=str(ex),
+        )
+        outgoing_invoice.status = "RECEIVED" if can_retry else "ERROR"
+        outgoing_invoice.mita_upload_desc = str(ex)[:1000]
+        # update() so a row that failed to save still leaves SENDING
+        OutgoingInvoice.objects.filter(pk=outgoing_invoice.pk).update(
+            status=outgoing_invoice.status,
+            mita_upload_desc=outgoing_invoice.mita_upload_desc,
+            modified_date=outgoing_invoice.modified_date,
+        )
+        return outgoing_invoice
+
+    struct_logger.info(
+        event="dispatch_outgoing_invoice",
+        outgoing_invoice=outgoing_invoice.pk,
+        status=outgoing_invoice.status,
+        status_code=response.status_code,
+    )
+
+    return outgoing_invoice
+
+
+def claim_pending_invoices(limit=100):
+    # Locks up to `limit` queued rows with FOR UPDATE SKIP LOCKED and marks
+    # them SENDING, so concurrent workers on any node never claim the same
+    # row. Rows that failed are only reclaimed after MITA_OUTBOX_RETRY_DELAY.
+    now = timezone.now()
+    retry_before = now - datetime.timedelta(seconds=settings.MITA_OUTBOX_RETRY_DELAY)
+
+    with transaction.atomic():
+        outgoing_invoices = list(
+            OutgoingInvoice.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status="RECEIVED", client_account__isnull=False)
+            .filter(Q(date_claimed__isnull=True) | Q(date_claimed__lt=retry_before))
+            .select_related("client_account")
+            .order_by("pk")[:limit]
+        )
+        OutgoingInvoice.objects.filter(
+            pk__in=[outgoing_invoice.pk for outgoing_invoice in outgoing_invoices]
+        ).update(status="SENDING", date_claimed=now)
+
+    for outgoing_invoice in outgoing_invoices:
+        outgoing_invoice.status = "SENDING"
+        outgoing_invoice.date_claimed = now
+
+    return outgoing_invoices
+
+
+def release_stale_invoices():
+    # Puts rows left SENDING by a worker that died back in the queue, rows
+    # out of attempts are failed instead
+    claimed_before = timezone.now() - datetime.timedelta(
+        seconds=settings.MITA_OUTBOX_CLAIM_TIMEOUT
+    )
+    stale = OutgoingInvoice.objects.filter(
+        status="SENDING", date_claimed__lt=claimed_before
+    )
+    stale.filter(attempts__gte=settings.MITA_OUTBOX_MAX_ATTEMPTS).update(
+        status="ERROR", mita_upload_desc="Gave up after the last attempt never finished"
+    )
+    return stale.update(status="RECEIVED")
+
+
+def dispatch_pending_invoices(limit=100, max_workers=1):
+    # Sends up to `limit` queued rows to mita on `max_workers` threads and
+    # returns the dispatched rows. Rows are claimed one round of
+    # `max_workers` at a time, so a claimed row is sent straight away and a
+    # slow batch never keeps rows SENDING past MITA_OUTBOX_CLAIM_TIMEOUT.
+    dispatched = []
+    while len(dispatched) < limit:
+        outgoing_invoices = claim_pending_invoices(
+            min(max_workers, limit - len(dispatched))
+        )
+        if not outgoing_invoices:
+            break
+
+        dispatched.extend(
+            outgoing_invoice
+            for _, outgoing_invoice in map_concurrently(
+                dispatch_outgoing_invoice, outgoing_invoices, max_workers=max_workers
+            )
+            if isinstance(outgoing_invoice, OutgoingInvoice)
+        )
+
+        if len(outgoing_invoices) < max_workers:
+            break
+
+    return dispatched
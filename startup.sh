@@ -4,6 +4,22 @@
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Create the shared database cache table if missing
+python manage.py createcachetable
+
+# Send queued invoices to mita
+echo "Starting invoice dispatcher..."
+python manage.py dispatch_invoices &
+
+# Recover xero webhook batches missed by the background workers
+python manage.py process_xero_webhooks &
+
+# Retry xero goods and adjustments a restart left pending
+python manage.py process_xero_goods &
+
+# Poll quickbooks change data capture for clients with cdc polling enabled
+python manage.py poll_quickbooks_cdc &
+
 # Start Gunicorn
 echo "Starting Gunicorn..."
 gunicorn taxmoja.wsgi:application --bind 0.0.0.0:8000
@@ -1,7 +1,166 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+import requests
+import structlog
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import connection, connections
 from django.shortcuts import get_object_or_404
 
 
+struct_logger = structlog.get_logger(__name__)
+
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+_background_executor = None
+_background_executor_lock = threading.Lock()
+
+
+class TTLCache:
+    # Thread-safe in-process cache, entries expire `ttl` seconds after they
+    # are set and the least recently used one is evicted past `maxsize`
+
+    def __init__(self, ttl, maxsize=1000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 def get_model_object_by_id (model, id):
     return get_object_or_404(model, pk=id)
-    
\ No newline at end of file
+
+
+def payload_hash(payload):
+    # Stable digest of a json payload, used to skip goods mita already has
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def advisory_xact_lock(namespace, key):
+    # Takes a postgres advisory lock released when the surrounding
+    # transaction ends, call it inside transaction.atomic(). A no-op on other
+    # databases.
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [namespace, key])
+
+
+def get_pooled_session(base_url, pool_size=10, keep_alive=True):
+    # Returns one process-wide session per base url so that every request to
+    # the same host reuses pooled keep-alive connections instead of paying a
+    # new TCP+TLS handshake. Sessions are shared between threads.
+    session = _http_sessions.get(base_url)
+    if session is not None:
+        return session
+
+    with _http_sessions_lock:
+        session = _http_sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if not keep_alive:
+                session.headers["Connection"] = "close"
+            _http_sessions[base_url] = session
+
+    return session
+
+
+def map_concurrently(func, items, max_workers=4):
+    # Runs func over items on a bounded thread pool and yields (item, result)
+    # pairs as they complete. Only a couple of items per worker are pulled
+    # ahead, so generators are consumed lazily. A raised exception is logged
+    # and yielded as the result.
+    def run(item):
+        try:
+            return func(item)
+        except Exception as ex:
+            struct_logger.error(event="map_concurrently", func=func.__name__, error=str(ex))
+            return ex
+        finally:
+            connections.close_all()
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for item in items:
+            pending[executor.submit(run, item)] = item
+            if len(pending) >= max_workers * 2:
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+            for item in items:
+                pending[executor.submit(run, item)] = item
+                if len(pending) >= max_workers * 2:
+                    break
+
+
+def run_in_background(func, *args, **kwargs):
+    # Submits func to a process-wide pool of BACKGROUND_WORKERS threads so a
+    # request can return before slow ERP or mita calls finish. Work must be
+    # recoverable from the database, a restart drops whatever is queued here.
+    global _background_executor
+
+    if _background_executor is None:
+        with _background_executor_lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_WORKERS,
+                    thread_name_prefix="taxmoja-background",
+                )
+
+    def run():
+        try:
+            return func(*args, **kwargs)
+        except Exception as ex:
+            struct_logger.error(event="run_in_background", func=func.__name__, error=str(ex))
+        finally:
+            connections.close_all()
+
+    return _background_executor.submit(run)
@@ -129,6 +129,129 @@ CACHES = {
     }
 }
 
+# MITA API
+# Submissions share one pooled keep-alive session per MITA base url
+
+MITA_HTTP_POOL_SIZE = env.int('MITA_HTTP_POOL_SIZE', default=20)
+MITA_HTTP_KEEP_ALIVE = env.bool('MITA_HTTP_KEEP_ALIVE', default=True)
+MITA_HTTP_CONNECT_TIMEOUT = env.float('MITA_HTTP_CONNECT_TIMEOUT', default=5.0)
+MITA_HTTP_READ_TIMEOUT = env.float('MITA_HTTP_READ_TIMEOUT', default=60.0)
+MITA_CREDENTIALS_CACHE_TTL = env.int('MITA_CREDENTIALS_CACHE_TTL', default=300)
+
+# Invoices are queued on manager_invoice.OutgoingInvoice and sent by the
+# dispatch_invoices worker command; set MITA_INVOICE_OUTBOX=False to send
+# inline. Any number of workers can run against the same database. Workers
+# claim MITA_OUTBOX_WORKERS rows at a time and send each at once, a row still
+# SENDING after one send could take twice over is considered abandoned.
+
+MITA_INVOICE_OUTBOX = env.bool('MITA_INVOICE_OUTBOX', default=True)
+MITA_OUTBOX_MAX_ATTEMPTS = env.int('MITA_OUTBOX_MAX_ATTEMPTS', default=5)
+MITA_OUTBOX_POLL_INTERVAL = env.float('MITA_OUTBOX_POLL_INTERVAL', default=2.0)
+MITA_OUTBOX_RETRY_DELAY = env.int('MITA_OUTBOX_RETRY_DELAY', default=30)
+MITA_OUTBOX_CLAIM_TIMEOUT = env.int(
+    'MITA_OUTBOX_CLAIM_TIMEOUT',
+    default=int(2 * (MITA_HTTP_CONNECT_TIMEOUT + MITA_HTTP_READ_TIMEOUT)),
+)
+MITA_OUTBOX_WORKERS = env.int('MITA_OUTBOX_WORKERS', default=8)
+
+# Background work
+# Threads used for work deferred out of requests, see run_in_background
+
+BACKGROUND_WORKERS = env.int('BACKGROUND_WORKERS', default=4)
+
+# Xero
+# With fast ack the webhook stores the signed event batch, answers at once
+# and processes it in the background; events left behind by a restart are
+# picked up by the process_xero_webhooks command after XERO_WEBHOOK_RETRY_AFTER
+
+XERO_WEBHOOK_FAST_ACK = env.bool('XERO_WEBHOOK_FAST_ACK', default=True)
+XERO_WEBHOOK_RETRY_AFTER = env.int('XERO_WEBHOOK_RETRY_AFTER', default=300)
+
+# Access tokens are cached per client and refreshed this many seconds before
+# they expire, one refresh per client at a time across all processes
+XERO_TOKEN_REFRESH_MARGIN = env.int('XERO_TOKEN_REFRESH_MARGIN', default=300)
+
+# Bulk goods syncs stream items into mita on XERO_GOODS_SYNC_WORKERS threads; a
+# sync without progress for XERO_GOODS_SYNC_STALE seconds may be resumed
+XERO_GOODS_SYNC_WORKERS = env.int('XERO_GOODS_SYNC_WORKERS', default=4)
+XERO_GOODS_SYNC_STALE = env.int('XERO_GOODS_SYNC_STALE', default=600)
+
+# Goods configured one at a time are buffered per client and created in xero
+# with one PUT per XERO_ITEM_BATCH_SIZE items, or XERO_ITEM_BATCH_DELAY seconds
+# after the first one
+XERO_ITEM_BATCH_SIZE = env.int('XERO_ITEM_BATCH_SIZE', default=50)
+XERO_ITEM_BATCH_DELAY = env.float('XERO_ITEM_BATCH_DELAY', default=2.0)
+
+# Goods and adjustments still pending XERO_GOODS_RETRY_AFTER seconds after
+# they were saved are retried by the process_xero_goods command
+XERO_GOODS_RETRY_AFTER = env.int('XERO_GOODS_RETRY_AFTER', default=600)
+
+# The stock-in contact used on goods adjustments is looked up once per client
+# and kept for XERO_CONTACT_CACHE_TTL seconds, saving the client clears it
+XERO_CONTACT_CACHE_TTL = env.int('XERO_CONTACT_CACHE_TTL', default=86400)
+
+# Quickbooks
+# Bearer tokens are cached per client and refreshed this many seconds before
+# they expire, a 401 forces one refresh and retry
+
+QUICKBOOKS_TOKEN_REFRESH_MARGIN = env.int('QUICKBOOKS_TOKEN_REFRESH_MARGIN', default=300)
+
+# Bulk goods configuration sends the paged items to mita on this many threads
+QUICKBOOKS_MITA_WORKERS = env.int('QUICKBOOKS_MITA_WORKERS', default=4)
+
+# Customers are kept in the shared cache per realm for
+# QUICKBOOKS_CUSTOMER_CACHE_TTL seconds, a Customer webhook or change data
+# capture event replaces or drops the entry for every worker
+QUICKBOOKS_CUSTOMER_CACHE_TTL = env.int('QUICKBOOKS_CUSTOMER_CACHE_TTL', default=3600)
+
+# Clients with cdc_polling are polled by the poll_quickbooks_cdc command every
+# QUICKBOOKS_CDC_INTERVAL seconds; the first poll looks back
+# QUICKBOOKS_CDC_INITIAL_LOOKBACK seconds
+QUICKBOOKS_CDC_INTERVAL = env.int('QUICKBOOKS_CDC_INTERVAL', default=300)
+QUICKBOOKS_CDC_INITIAL_LOOKBACK = env.int('QUICKBOOKS_CDC_INITIAL_LOOKBACK', default=3600)
+
+# Dear
+# Requests share one pooled keep-alive session per Dear base url
+
+DEAR_HTTP_POOL_SIZE = env.int('DEAR_HTTP_POOL_SIZE', default=10)
+DEAR_HTTP_CONNECT_TIMEOUT = env.float('DEAR_HTTP_CONNECT_TIMEOUT', default=5.0)
+DEAR_HTTP_READ_TIMEOUT = env.float('DEAR_HTTP_READ_TIMEOUT', default=60.0)
+
+# Customers are cached per client for DEAR_CUSTOMER_CACHE_TTL seconds, keeping
+# at most DEAR_CUSTOMER_CACHE_SIZE of them per client
+DEAR_CUSTOMER_CACHE_TTL = env.int('DEAR_CUSTOMER_CACHE_TTL', default=900)
+DEAR_CUSTOMER_CACHE_SIZE = env.int('DEAR_CUSTOMER_CACHE_SIZE', default=1000)
+
+# Products are cached the same way; a stock adjustment missing more than
+# DEAR_PRODUCT_PAGE_THRESHOLD of them pages through the product list instead
+# of fetching each one, and sends its lines to mita on DEAR_MITA_WORKERS threads
+DEAR_PRODUCT_CACHE_TTL = env.int('DEAR_PRODUCT_CACHE_TTL', default=3600)
+DEAR_PRODUCT_CACHE_SIZE = env.int('DEAR_PRODUCT_CACHE_SIZE', default=5000)
+DEAR_PRODUCT_PAGE_THRESHOLD = env.int('DEAR_PRODUCT_PAGE_THRESHOLD', default=20)
+DEAR_MITA_WORKERS = env.int('DEAR_MITA_WORKERS', default=4)
+
+# Requests per dear account are throttled with a token bucket kept in the
+# database so every worker shares it. Dear allows 60 calls a minute, the
+# defaults stay just below that. A 429 pauses the account for its Retry-After
+# and the call is retried up to DEAR_RATE_LIMIT_MAX_RETRIES times.
+DEAR_RATE_LIMIT_PER_MINUTE = env.int('DEAR_RATE_LIMIT_PER_MINUTE', default=55)
+DEAR_RATE_LIMIT_BURST = env.int('DEAR_RATE_LIMIT_BURST', default=5)
+DEAR_RATE_LIMIT_MAX_RETRIES = env.int('DEAR_RATE_LIMIT_MAX_RETRIES', default=5)
+
+# Order Easy
+# Bulk goods configuration sends the paged products to mita on this many threads
+
+OE_MITA_WORKERS = env.int('OE_MITA_WORKERS', default=4)
+
+# Clients are cached per account for OE_CLIENT_CACHE_TTL seconds and share one
+# pooled session per ordereasy url; responses are logged up to
+# OE_LOG_RESPONSE_CHARS characters
+OE_CLIENT_CACHE_TTL = env.int('OE_CLIENT_CACHE_TTL', default=300)
+OE_HTTP_POOL_SIZE = env.int('OE_HTTP_POOL_SIZE', default=10)
+OE_HTTP_CONNECT_TIMEOUT = env.float('OE_HTTP_CONNECT_TIMEOUT', default=5.0)
+OE_HTTP_READ_TIMEOUT = env.float('OE_HTTP_READ_TIMEOUT', default=60.0)
+OE_LOG_RESPONSE_CHARS = env.int('OE_LOG_RESPONSE_CHARS', default=1000)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 